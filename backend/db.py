@@ -1,7 +1,119 @@
+"""
+Datenbankzugriff des Backends – Primary und optionales Lese-Replikat
+
+DATABASE_URL       – Primary (Schreibzugriffe des Workers, LISTEN/NOTIFY, Health)
+DATABASE_READ_URL  – optionales Streaming-Replikat für die lesenden Endpunkte
+
+lese_verbindung() liefert eine Verbindung zum Replikat, solange es höchstens
+REPLICA_MAX_LAG Sekunden hinter dem letzten Worker-Takt liegt, sonst zum
+Primary. Maßstab ist `worker_heartbeat.letzter_takt`: Er wird in derselben
+Transaktion wie die Daten des Takts geschrieben – zeigt das Replikat denselben
+Wert wie der Primary, ist der komplette Takt repliziert.
+
+Geprüft wird höchstens alle REPLICA_CHECK_SEC Sekunden (und nach jedem Takt,
+siehe main.py); ist das Replikat nicht erreichbar, wird bis zur nächsten
+Prüfung der Primary verwendet.
+"""
+
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 
-from sqlalchemy import create_engine
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.environ["DATABASE_URL"]
+DATABASE_READ_URL = os.environ.get("DATABASE_READ_URL", "")
+REPLICA_MAX_LAG = float(os.environ.get("REPLICA_MAX_LAG", "0"))       # Sekunden hinter dem Takt
+_CHECK_SEC = float(os.environ.get("REPLICA_CHECK_SEC", "5"))
 
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+replica_engine: Engine | None = (
+    create_engine(DATABASE_READ_URL, pool_pre_ping=True, connect_args={"connect_timeout": 3})
+    if DATABASE_READ_URL else None
+)
+
+_LETZTER_TAKT = text("SELECT MAX(letzter_takt) FROM worker_heartbeat")
+
+_lock = threading.Lock()
+_replikat_ok = False
+_lag: float | None = None   # Sekunden hinter dem Primary bei der letzten Prüfung
+_geprueft = 0.0             # time.monotonic() der letzten Prüfung (0 = sofort prüfen)
+
+
+def _letzter_takt(eng: Engine):
+    with eng.connect() as conn:
+        return conn.execute(_LETZTER_TAKT).scalar()
+
+
+def _pruefen() -> tuple[bool, float | None]:
+    """(Replikat verwendbar, Rückstand in Sekunden) – zwei Index-Zugriffe."""
+    try:
+        replikat = _letzter_takt(replica_engine)
+    except Exception as exc:
+        logger.warning("Lese-Replikat nicht erreichbar – lese vom Primary: %s", exc)
+        return False, None
+    try:
+        primaer = _letzter_takt(engine)
+    except Exception as exc:
+        # Ohne Primary lässt sich der Rückstand nicht bestimmen – besser alt als gar nicht
+        logger.warning("Primary nicht erreichbar – lese vom Replikat: %s", exc)
+        return True, None
+    if primaer is None:
+        return True, 0.0        # noch kein Takt gelaufen
+    if replikat is None:
+        return False, None
+    lag = max(0.0, (primaer - replikat).total_seconds())
+    return lag <= REPLICA_MAX_LAG, lag
+
+
+def neu_pruefen() -> None:
+    """Erzwingt vor der nächsten Leseabfrage eine neue Prüfung (nach jedem Takt)."""
+    global _geprueft
+    _geprueft = 0.0
+
+
+def _lese_engine() -> Engine:
+    global _replikat_ok, _lag, _geprueft
+    if replica_engine is None:
+        return engine
+    # Nur ein Thread prüft; alle anderen nutzen solange die letzte Entscheidung
+    if time.monotonic() - _geprueft >= _CHECK_SEC and _lock.acquire(blocking=False):
+        try:
+            ok, lag = _pruefen()
+            if ok != _replikat_ok:
+                logger.info("Leseabfragen jetzt über %s (Rückstand %s s).",
+                            "Replikat" if ok else "Primary", lag)
+            _replikat_ok, _lag, _geprueft = ok, lag, time.monotonic()
+        finally:
+            _lock.release()
+    return replica_engine if _replikat_ok else engine
+
+
+@contextmanager
+def lese_verbindung():
+    """Verbindung für lesende Abfragen: Replikat, falls aktuell genug, sonst Primary."""
+    global _replikat_ok
+    eng = _lese_engine()
+    try:
+        conn = eng.connect()
+    except OperationalError as exc:
+        if eng is engine:
+            raise
+        logger.warning("Lese-Replikat ausgefallen – lese vom Primary: %s", exc)
+        _replikat_ok = False
+        conn = engine.connect()
+    with conn:
+        yield conn
+
+
+def replikat_status() -> dict | None:
+    """Stand der letzten Prüfung für /health (None ohne DATABASE_READ_URL)."""
+    if replica_engine is None:
+        return None
+    return {"aktiv": _replikat_ok, "lag_s": _lag, "max_lag_s": REPLICA_MAX_LAG}
@@ -2,21 +2,37 @@
 REST API – Phase 6
 
 Endpunkte:
-  GET /health                  – Healthcheck
+  GET /health                  – Healthcheck (Kurz-Statistik als Schätzwerte)
+  GET /health/live             – Liveness (ohne DB)
+  GET /health/ready            – Readiness: DB + Worker-Heartbeat (503 wenn nicht bereit)
   GET /empfehlungen            – Aktuelle Top-10-Long + Top-10-Short
   GET /statistik               – Trefferquote & Ergebnis je Aktie
   GET /statistik/gesamt        – Aggregierte KNN-Performance
   GET /kurse?aktie=AAPL        – Kursverlauf einer Aktie (letzte 24 h)
+  GET /trades                  – Trade-Historie (Filter, Keyset-Pagination, CSV)
+  GET /empfehlungen/history    – Empfehlungs-Historie (Filter, Keyset-Pagination, CSV)
+  GET /stream?aktien=AAPL      – Server-Sent Events: Delta je Worker-Takt
+  GET /dashboard               – Alles für die Startseite in einer Antwort (JSON/MessagePack)
+  POST /admin/profile          – Profiling der nächsten N Requests bzw. Worker-Takte (ADMIN_TOKEN)
 """
 
+import base64
+import csv
+import hmac
+import io
 import logging
 import os
+from datetime import datetime
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy import text
 
-from db import engine
+import profiling
+from db import engine, lese_verbindung, neu_pruefen, replikat_status
+from snapshot import MEDIA_TYPES, DashboardSnapshot, encoding_aus_accept, format_aus_accept
+from stream import event_stream, on_tick
 
 logging.basicConfig(
     level=getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO),
@@ -32,30 +48,95 @@ app.add_middleware(
     allow_methods=["GET"],
     allow_headers=["*"],
 )
+app.add_middleware(profiling.ProfilMiddleware)
+
+# Nach jedem Takt vor der nächsten Leseabfrage prüfen, ob das Replikat ihn schon hat
+on_tick(neu_pruefen)
 
 
 # ── Health ────────────────────────────────────────────────────────────────────
-@app.get("/health")
-def health():
-    """Healthcheck mit DB-Verbindungstest und Kurz-Statistik."""
-    db_ok = False
-    kurse_count = 0
-    trades_count = 0
+# Alle Checks kosten unabhängig von der Tabellengröße nur einen Index-/Katalog-
+# Zugriff: Zeilenzahlen sind Schätzungen aus pg_class (aktualisiert durch
+# (auto)VACUUM/ANALYZE), der Worker-Zustand kommt aus `worker_heartbeat`.
+# Health liest immer vom Primary; alle übrigen Endpunkte über lese_verbindung().
+_HEARTBEAT_MAX_AGE = float(os.environ.get("HEALTH_HEARTBEAT_MAX_AGE", "600"))  # Sekunden
+_WORKER_SHARDS = max(1, int(os.environ.get("WORKER_SHARDS", "1")))
+
+# Je erwartetem Shard (0…WORKER_SHARDS-1) zählt der älteste Wert – ein
+# ausgefallener Shard fällt so nicht hinter einem gesunden zurück.
+# Takt-Alter nur für Shards, die beim letzten Lauf Handelszeit hatten.
+_STATUS_QUERY = text("""
+    SELECT
+        (SELECT reltuples::BIGINT FROM pg_class WHERE oid = 'kurse'::regclass),
+        (SELECT reltuples::BIGINT FROM pg_class WHERE oid = 'trades'::regclass),
+        h.anzahl, h.gesehen, h.takt, now()
+    FROM (
+        SELECT COUNT(*)                                                        AS anzahl,
+               MIN(gesehen_at)                                                 AS gesehen,
+               MIN(COALESCE(letzter_takt, 'epoch')) FILTER (WHERE markt_offen) AS takt
+        FROM worker_heartbeat
+        WHERE shard < :shards
+    ) h
+""")
+
+
+def _status() -> dict:
+    """DB-Verbindung, geschätzte Zeilenzahlen und Worker-Heartbeat (eine Abfrage)."""
     try:
         with engine.connect() as conn:
-            db_ok = True
-            kurse_count  = conn.execute(text("SELECT COUNT(*) FROM kurse")).scalar() or 0
-            trades_count = conn.execute(text("SELECT COUNT(*) FROM trades")).scalar() or 0
+            kurse, trades, shards, gesehen, takt, jetzt = conn.execute(
+                _STATUS_QUERY, {"shards": _WORKER_SHARDS},
+            ).one()
     except Exception as exc:
         logger.warning("Health-DB-Fehler: %s", exc)
+        return {"db": False, "kurse": 0, "trades": 0, "worker_shards": 0,
+                "worker_alter_s": None, "takt_alter_s": None}
     return {
-        "status": "ok" if db_ok else "degraded",
-        "db": db_ok,
-        "kurse": kurse_count,
-        "trades": trades_count,
+        "db": True,
+        # reltuples = -1: Tabelle wurde noch nie analysiert
+        "kurse": max(kurse or 0, 0),
+        "trades": max(trades or 0, 0),
+        "worker_shards": shards,
+        "worker_alter_s": round((jetzt - gesehen).total_seconds(), 1) if gesehen else None,
+        # None: kein Shard in Handelszeit – dann wird kein frischer Takt erwartet
+        "takt_alter_s": round((jetzt - takt).total_seconds(), 1) if takt else None,
     }
 
 
+@app.get("/health")
+def health():
+    """Healthcheck mit DB-Verbindungstest und Kurz-Statistik (Schätzwerte)."""
+    status = _status()
+    return {"status": "ok" if status["db"] else "degraded", **status, "replikat": replikat_status()}
+
+
+@app.get("/health/live")
+def health_live():
+    """Liveness: Prozess antwortet (ohne DB-Zugriff)."""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def health_ready():
+    """
+    Readiness: DB erreichbar, alle WORKER_SHARDS Shards haben sich innerhalb von
+    HEALTH_HEARTBEAT_MAX_AGE Sekunden gemeldet und – während der Handelszeit –
+    auch so lange zuletzt einen Takt erfolgreich gespeichert. Sonst HTTP 503.
+    """
+    status = _status()
+    worker_ok = (
+        status["worker_shards"] >= _WORKER_SHARDS
+        and status["worker_alter_s"] is not None
+        and status["worker_alter_s"] <= _HEARTBEAT_MAX_AGE
+        and (status["takt_alter_s"] is None or status["takt_alter_s"] <= _HEARTBEAT_MAX_AGE)
+    )
+    ready = status["db"] and worker_ok
+    return JSONResponse(
+        {"status": "ready" if ready else "not_ready", "worker": worker_ok, **status},
+        status_code=200 if ready else 503,
+    )
+
+
 # ── Empfehlungen ──────────────────────────────────────────────────────────────
 @app.get("/empfehlungen")
 def get_empfehlungen():
@@ -63,7 +144,7 @@ def get_empfehlungen():
     Gibt die aktuellsten KNN-Empfehlungen zurück (letzter Inferenz-Zeitpunkt).
     Antwort: {"timestamp": "...", "long": [...], "short": [...]}
     """
-    with engine.connect() as conn:
+    with lese_verbindung() as conn:
         # Neuesten Zeitstempel ermitteln
         ts_row = conn.execute(
             text("SELECT MAX(timestamp) FROM empfehlungen")
@@ -97,7 +178,7 @@ def get_empfehlungen():
 @app.get("/statistik")
 def get_statistik():
     """Trefferquote und Ergebnis je Aktie aus der aggregierten View."""
-    with engine.connect() as conn:
+    with lese_verbindung() as conn:
         rows = conn.execute(
             text("""
                 SELECT aktie, trades_gesamt, trades_gewinn, trades_verlust,
@@ -125,7 +206,7 @@ def get_statistik():
 @app.get("/statistik/gesamt")
 def get_statistik_gesamt():
     """Aggregierte KNN-Performance über alle Aktien."""
-    with engine.connect() as conn:
+    with lese_verbindung() as conn:
         row = conn.execute(
             text("""
                 SELECT
@@ -164,7 +245,7 @@ def get_kurse(
     stunden: int = Query(24, ge=1, le=336, description="Anzahl Stunden zurück (max. 336 = 2 Wochen)"),
 ):
     """Kursverlauf einer Aktie für den Chart (5-Minuten-Auflösung)."""
-    with engine.connect() as conn:
+    with lese_verbindung() as conn:
         rows = conn.execute(
             text("""
                 SELECT timestamp, wert
@@ -186,3 +267,301 @@ def get_kurse(
             for r in rows
         ],
     }
+
+
+# ── Dashboard (Snapshot) ──────────────────────────────────────────────────────
+def _dashboard_basis() -> dict:
+    return {
+        "empfehlungen": get_empfehlungen(),
+        "statistik": get_statistik(),
+        "gesamt": get_statistik_gesamt(),
+        "health": _status(),
+    }
+
+
+def _dashboard_kurse(aktie: str, stunden: int) -> dict | None:
+    """Kursverlauf spaltenweise (kompakter als eine Liste von Objekten)."""
+    try:
+        d = get_kurse(aktie, stunden)
+    except HTTPException:
+        return None
+    return {
+        "aktie": d["aktie"],
+        "stunden": stunden,
+        "timestamps": [k["timestamp"] for k in d["kurse"]],
+        "werte": [k["wert"] for k in d["kurse"]],
+    }
+
+
+_snapshot = DashboardSnapshot(_dashboard_basis, _dashboard_kurse)
+
+
+@app.get("/dashboard")
+def dashboard(
+    request: Request,
+    aktie: str | None = Query(None, description="Ticker für den Kursverlauf (Standard: erste Empfehlung)"),
+    stunden: int = Query(24, ge=1, le=336),
+    kurse: bool = Query(True, description="Kursverlauf mitliefern"),
+):
+    """
+    Empfehlungen, Statistik je Aktie, Gesamtstatistik, Health und Kursverlauf
+    in einer Antwort aus dem Takt-Snapshot. JSON oder MessagePack per Accept,
+    br/gzip per Accept-Encoding; unveränderte Antworten per ETag → 304.
+    """
+    fmt = format_aus_accept(request.headers.get("accept", ""))
+    encoding = encoding_aus_accept(request.headers.get("accept-encoding", ""))
+    etag, body = _snapshot.antwort(
+        aktie.upper() if aktie else None, stunden, kurse, fmt, encoding,
+    )
+    headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding", "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+# ── Push-Kanal (SSE) ──────────────────────────────────────────────────────────
+@app.get("/stream")
+async def stream(
+    aktien: str | None = Query(None, description="Kommagetrennte Ticker, deren Kurse gepusht werden"),
+):
+    """
+    Server-Sent Events: Nach jedem Worker-Takt ein Delta mit neuen Empfehlungen,
+    geschlossenen Trades und aktuellen Kursen (optional auf `aktien` gefiltert).
+    """
+    watched = {a.strip().upper() for a in aktien.split(",") if a.strip()} if aktien else None
+    return StreamingResponse(
+        event_stream(watched),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ── Historie: Keyset-Pagination ───────────────────────────────────────────────
+# Statt OFFSET wird über (Zeitstempel, id) geblättert: Der Cursor enthält den
+# letzten Schlüssel der vorherigen Seite, die Folgeseite beginnt per Index-Seek
+# direkt dahinter – konstante Kosten unabhängig von der Seitentiefe.
+
+_CSV_BATCH = 1000  # Zeilen je fetchmany() beim Streaming-Export
+
+
+def _encode_cursor(ts: datetime, row_id: int) -> str:
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts_raw, id_raw = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(ts_raw), int(id_raw)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Ungültiger Cursor.")
+
+
+def _history_query(
+    table: str, ts_col: str, columns: list[str],
+    aktie: str | None, richtung: str | None,
+    von: datetime | None, bis: datetime | None,
+    cursor: str | None, limit: int | None,
+) -> tuple[str, dict]:
+    """
+    Baut die gefilterte Historien-Abfrage, absteigend nach (ts_col, id).
+    Tabellen- und Spaltennamen stammen ausschließlich aus dem Code.
+    """
+    where: list[str] = []
+    params: dict = {}
+    if aktie:
+        where.append("aktie = :aktie")
+        params["aktie"] = aktie.upper()
+    if richtung:
+        where.append("richtung = :richtung")
+        params["richtung"] = richtung
+    if von:
+        where.append(f"{ts_col} >= :von")
+        params["von"] = von
+    if bis:
+        where.append(f"{ts_col} < :bis")
+        params["bis"] = bis
+    if cursor:
+        params["c_ts"], params["c_id"] = _decode_cursor(cursor)
+        where.append(f"({ts_col}, id) < (:c_ts, :c_id)")
+
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {ts_col} DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return sql, params
+
+
+def _csv_value(v) -> object:
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+def _stream_csv(sql: str, params: dict, columns: list[str], filename: str) -> StreamingResponse:
+    """Streamt das Abfrageergebnis als CSV direkt aus einem serverseitigen DB-Cursor."""
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+        with lese_verbindung() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(sql), params)
+            while batch := result.fetchmany(_CSV_BATCH):
+                writer.writerows([_csv_value(v) for v in r] for r in batch)
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _page(rows: list, limit: int, ts_idx: int, to_dict) -> dict:
+    """Formatiert eine Seite; next_cursor ist None auf der letzten Seite."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = (
+        _encode_cursor(rows[-1][ts_idx], rows[-1][0]) if has_more and rows else None
+    )
+    return {"items": [to_dict(r) for r in rows], "next_cursor": next_cursor}
+
+
+def _num(v) -> float | None:
+    return float(v) if v is not None else None
+
+
+# ── Trade-Historie ────────────────────────────────────────────────────────────
+_TRADE_COLUMNS = [
+    "id", "aktie", "richtung", "eroeffnet_at", "einstiegskurs", "geschlossen_at",
+    "schliessgrund", "einsatz_eur", "gebuehr_eroeffnung_eur",
+    "gebuehr_schliessung_eur", "ergebnis_eur", "reward",
+]
+
+
+@app.get("/trades")
+def get_trades(
+    aktie: str | None = Query(None, description="Ticker-Symbol, z. B. AAPL"),
+    richtung: str | None = Query(None, pattern="^(long|short)$"),
+    von: datetime | None = Query(None, description="Eröffnet ab (inklusive, ISO 8601)"),
+    bis: datetime | None = Query(None, description="Eröffnet vor (exklusive, ISO 8601)"),
+    cursor: str | None = Query(None, description="next_cursor der vorherigen Seite"),
+    limit: int = Query(100, ge=1, le=1000),
+    format: str = Query("json", pattern="^(json|csv)$"),
+):
+    """
+    Virtuelle Trades, neueste zuerst, blätterbar per Keyset-Cursor auf
+    (eroeffnet_at, id). Mit format=csv wird die gesamte gefilterte Menge
+    ohne Limit als CSV gestreamt.
+    """
+    if format == "csv":
+        sql, params = _history_query(
+            "trades", "eroeffnet_at", _TRADE_COLUMNS,
+            aktie, richtung, von, bis, cursor, None,
+        )
+        return _stream_csv(sql, params, _TRADE_COLUMNS, "trades.csv")
+
+    sql, params = _history_query(
+        "trades", "eroeffnet_at", _TRADE_COLUMNS,
+        aktie, richtung, von, bis, cursor, limit + 1,
+    )
+    with lese_verbindung() as conn:
+        rows = conn.execute(text(sql), params).fetchall()
+
+    return _page(rows, limit, ts_idx=3, to_dict=lambda r: {
+        "id": r[0],
+        "aktie": r[1],
+        "richtung": r[2],
+        "eroeffnet_at": r[3].isoformat(),
+        "einstiegskurs": _num(r[4]),
+        "geschlossen_at": r[5].isoformat() if r[5] else None,
+        "schliessgrund": r[6],
+        "einsatz_eur": _num(r[7]),
+        "gebuehr_eroeffnung_eur": _num(r[8]),
+        "gebuehr_schliessung_eur": _num(r[9]),
+        "ergebnis_eur": _num(r[10]),
+        "reward": _num(r[11]),
+    })
+
+
+# ── Empfehlungs-Historie ──────────────────────────────────────────────────────
+_EMPFEHLUNG_COLUMNS = ["id", "timestamp", "aktie", "richtung", "knn_wert"]
+
+
+@app.get("/empfehlungen/history")
+def get_empfehlungen_history(
+    aktie: str | None = Query(None, description="Ticker-Symbol, z. B. AAPL"),
+    richtung: str | None = Query(None, pattern="^(long|short)$"),
+    von: datetime | None = Query(None, description="Ab Zeitpunkt (inklusive, ISO 8601)"),
+    bis: datetime | None = Query(None, description="Vor Zeitpunkt (exklusive, ISO 8601)"),
+    cursor: str | None = Query(None, description="next_cursor der vorherigen Seite"),
+    limit: int = Query(100, ge=1, le=1000),
+    format: str = Query("json", pattern="^(json|csv)$"),
+):
+    """
+    Vergangene KNN-Empfehlungen, neueste zuerst, blätterbar per Keyset-Cursor
+    auf (timestamp, id). Mit format=csv wird die gesamte gefilterte Menge
+    ohne Limit als CSV gestreamt.
+    """
+    if format == "csv":
+        sql, params = _history_query(
+            "empfehlungen", "timestamp", _EMPFEHLUNG_COLUMNS,
+            aktie, richtung, von, bis, cursor, None,
+        )
+        return _stream_csv(sql, params, _EMPFEHLUNG_COLUMNS, "empfehlungen.csv")
+
+    sql, params = _history_query(
+        "empfehlungen", "timestamp", _EMPFEHLUNG_COLUMNS,
+        aktie, richtung, von, bis, cursor, limit + 1,
+    )
+    with lese_verbindung() as conn:
+        rows = conn.execute(text(sql), params).fetchall()
+
+    return _page(rows, limit, ts_idx=1, to_dict=lambda r: {
+        "id": r[0],
+        "timestamp": r[1].isoformat(),
+        "aktie": r[2],
+        "richtung": r[3],
+        "knn_wert": float(r[4]),
+    })
+
+
+# ── Admin: Profiling auf Abruf ────────────────────────────────────────────────
+# Nur mit gesetztem ADMIN_TOKEN verfügbar; nginx leitet /admin nicht weiter.
+_ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+
+@app.post("/admin/profile")
+def admin_profile(
+    ziel: str = Query("backend", pattern="^(backend|worker)$"),
+    anzahl: int = Query(10, ge=0, le=1000, description="Anzahl Requests bzw. Takte (0 = abbrechen)"),
+    pfad: str = Query("", description="Nur Requests mit diesem Pfad-Präfix (nur ziel=backend)"),
+    x_admin_token: str = Header(""),
+):
+    """
+    Profiliert die nächsten `anzahl` Backend-Requests oder Worker-Takte mit
+    cProfile und tracemalloc. Die Ergebnisse landen im Modell-Volume unter
+    profile/ (siehe backend/profiling.py und worker/profiling.py).
+    """
+    if not _ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin-Endpunkte deaktiviert (ADMIN_TOKEN nicht gesetzt).")
+    if not hmac.compare_digest(x_admin_token.encode(), _ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Ungültiges Admin-Token.")
+    if ziel == "worker":
+        profiling.worker_anfordern(anzahl)
+    else:
+        profiling.anfordern(anzahl, pfad)
+    return {
+        "ziel": ziel,
+        "anzahl": anzahl,
+        "pfad": pfad if ziel == "backend" else None,
+        "verzeichnis": str(profiling.PROFILE_DIR),
+    }
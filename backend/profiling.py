@@ -0,0 +1,146 @@
+"""
+Profiling auf Abruf – cProfile und tracemalloc für die nächsten N Requests
+
+Aktivierung ohne Neu-Deployment:
+  PROFILE_REQUESTS=N, PROFILE_PFAD=/kurse  – beim Start (Pfad-Präfix optional)
+  POST /admin/profile?ziel=backend&anzahl=N&pfad=/kurse
+                                          – zur Laufzeit (siehe main.py)
+
+Je profiliertem Request entsteht MODEL_DIR/profile/backend/<Zeitstempel>-<pfad>/ mit
+  request.prof        – cProfile (pstats), z. B. `python -m pstats`, snakeviz
+  request.tracemalloc – Allokations-Snapshot (tracemalloc.Snapshot.load)
+  zusammenfassung.txt – Dauer, Status und größte Allokationszuwächse
+
+Es wird immer nur ein Request gleichzeitig profiliert. Ab Python 3.12 erfasst
+cProfile alle Threads (sys.monitoring) – also auch den Thread-Pool, in dem die
+synchronen Endpunkte laufen, allerdings ebenso parallel laufende Requests.
+/stream und /admin werden nie profiliert.
+"""
+
+import asyncio
+import cProfile
+import logging
+import os
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Allokationen der Messung selbst ausblenden
+_FILTER = [tracemalloc.Filter(False, m.__file__) for m in (tracemalloc, cProfile)] + [
+    tracemalloc.Filter(False, __file__),
+]
+
+PROFILE_DIR = Path(os.environ.get("MODEL_DIR", "/app/models")) / "profile"
+WORKER_ANFORDERUNG = PROFILE_DIR / "worker.anfordern"   # siehe worker/profiling.py
+
+_FRAMES = 10   # Stacktiefe je Allokation
+_TOP = 25      # Zeilen in der Zusammenfassung
+_AUSGENOMMEN = ("/stream", "/admin")
+
+_lock = threading.Lock()
+_aktiv = threading.Lock()   # gehalten, solange ein Request profiliert wird
+_restliche = max(0, int(os.environ.get("PROFILE_REQUESTS", "0")))
+_pfad = os.environ.get("PROFILE_PFAD", "")
+
+
+def anfordern(anzahl: int, pfad: str = "") -> None:
+    """Profiliert die nächsten `anzahl` Requests (nur Pfade mit Präfix `pfad`)."""
+    global _restliche, _pfad
+    with _lock:
+        _restliche, _pfad = anzahl, pfad
+    logger.info("Profiling angefordert: die nächsten %d Requests %s", anzahl, pfad or "(alle Pfade)")
+
+
+def worker_anfordern(anzahl: int) -> None:
+    """Legt die Anforderung für die Worker ab (gemeinsames Modell-Volume)."""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = WORKER_ANFORDERUNG.with_suffix(".tmp")
+    tmp.write_text(f"{anzahl}\n")
+    tmp.replace(WORKER_ANFORDERUNG)
+
+
+def _beanspruchen(pfad: str) -> bool:
+    """True, wenn dieser Request profiliert werden soll (hält dann `_aktiv`)."""
+    global _restliche
+    if _restliche <= 0 or pfad.startswith(_AUSGENOMMEN):
+        return False
+    with _lock:
+        if _restliche <= 0 or not pfad.startswith(_pfad):
+            return False
+        if not _aktiv.acquire(blocking=False):
+            return False
+        _restliche -= 1
+    return True
+
+
+class _Messung:
+    def __init__(self, pfad: str) -> None:
+        stempel = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+        self.pfad = pfad
+        self.verzeichnis = PROFILE_DIR / "backend" / f"{stempel}-{re.sub(r'[^A-Za-z0-9]+', '_', pfad).strip('_')}"
+        self.status: int | None = None
+        self._tracemalloc_eigen = not tracemalloc.is_tracing()
+        if self._tracemalloc_eigen:
+            tracemalloc.start(_FRAMES)
+        self._vorher = tracemalloc.take_snapshot().filter_traces(_FILTER)
+        self._profil = cProfile.Profile()
+        self._start = time.perf_counter()
+        self._profil.enable()
+
+    def beenden(self) -> None:
+        self._profil.disable()
+        self._dauer = time.perf_counter() - self._start
+        self._nachher = tracemalloc.take_snapshot().filter_traces(_FILTER)
+        self._spitze = tracemalloc.get_traced_memory()[1]
+        if self._tracemalloc_eigen:
+            tracemalloc.stop()
+
+    def schreiben(self) -> None:
+        try:
+            self.verzeichnis.mkdir(parents=True, exist_ok=True)
+            self._profil.dump_stats(self.verzeichnis / "request.prof")
+            self._nachher.dump(str(self.verzeichnis / "request.tracemalloc"))
+            zuwachs = self._nachher.compare_to(self._vorher, "lineno")[:_TOP]
+            (self.verzeichnis / "zusammenfassung.txt").write_text(
+                f"{self.pfad}: {self._dauer:.3f}s  Status={self.status}  "
+                f"spitze={self._spitze / 1e6:.1f} MB (inkl. tracemalloc-Overhead)\n\n"
+                + "\n".join(str(z) for z in zuwachs) + "\n"
+            )
+        except Exception as exc:
+            logger.warning("Request-Profil nicht gespeichert: %s", exc)
+            return
+        logger.info("Request-Profil gespeichert: %s (%.3fs)", self.verzeichnis, self._dauer)
+
+
+class ProfilMiddleware:
+    """ASGI-Middleware: profiliert angeforderte Requests vollständig inkl. Body."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _beanspruchen(scope["path"]):
+            return await self.app(scope, receive, send)
+
+        try:
+            messung = _Messung(scope["path"])
+        except Exception:
+            _aktiv.release()
+            raise
+
+        async def senden(message):
+            if message["type"] == "http.response.start":
+                messung.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, senden)
+        finally:
+            messung.beenden()
+            _aktiv.release()
+            await asyncio.to_thread(messung.schreiben)
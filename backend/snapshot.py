@@ -0,0 +1,187 @@
+"""
+Dashboard-Snapshot – einmal je Worker-Takt gebaute Antwort für /dashboard
+
+Empfehlungen, Statistiken und Health werden nach jedem Takt genau einmal aus
+der DB gelesen; Kursverläufe je (Aktie, Stunden) beim ersten Abruf. Fertig
+kodierte und komprimierte Antworten werden je Variante (Format, Encoding)
+zwischengespeichert, sodass wiederholte Abrufe keine DB-Abfrage und keine
+Serialisierung mehr kosten.
+
+Invalidiert wird per NOTIFY des Workers (stream.on_tick); DASHBOARD_MAX_AGE
+begrenzt das Alter zusätzlich, falls der Listener gerade neu verbindet.
+
+Formate  : JSON (Standard) oder MessagePack (Accept: application/msgpack)
+Encoding : br, gzip oder keins – nach Accept-Encoding
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from collections.abc import Callable
+from concurrent.futures import Future
+
+import brotli
+import msgpack
+
+from stream import on_tick
+
+MAX_AGE_SEC = float(os.environ.get("DASHBOARD_MAX_AGE", "60"))
+_MAX_VARIANTEN = 512   # Obergrenze zwischengespeicherter Antworten je Snapshot
+
+MEDIA_TYPES = {"json": "application/json", "msgpack": "application/msgpack"}
+
+
+def format_aus_accept(accept: str) -> str:
+    """MessagePack nur auf ausdrücklichen Wunsch, sonst JSON."""
+    accept = accept.lower()
+    return "msgpack" if "msgpack" in accept else "json"
+
+
+def encoding_aus_accept(accept_encoding: str) -> str:
+    angeboten = {
+        teil.split(";")[0].strip()
+        for teil in accept_encoding.lower().split(",")
+        if not teil.strip().endswith("q=0")
+    }
+    if "br" in angeboten:
+        return "br"
+    if "gzip" in angeboten:
+        return "gzip"
+    return "identity"
+
+
+def _kodieren(daten: dict, fmt: str) -> bytes:
+    if fmt == "msgpack":
+        return msgpack.packb(daten, use_bin_type=True)
+    return json.dumps(daten, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _komprimieren(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def standard_aktie(empfehlungen: dict) -> str | None:
+    """Erste Aktie (alphabetisch) der aktuellen Empfehlungen – wie im Frontend."""
+    aktien = {e["aktie"] for e in empfehlungen["long"] + empfehlungen["short"]}
+    return min(aktien) if aktien else None
+
+
+class DashboardSnapshot:
+    """
+    Der globale Lock schützt nur die Caches selbst. DB-Abfragen, Kodierung und
+    Kompression laufen außerhalb; je Schlüssel rechnet nur ein Thread (Single-
+    Flight), gleichzeitige Anfragen nach demselben Schlüssel warten auf dessen
+    Ergebnis. Cache-Treffer blockieren nie auf einen laufenden Aufbau.
+    """
+
+    def __init__(
+        self,
+        basis: Callable[[], dict],
+        kurse: Callable[[str, int], dict | None],
+    ) -> None:
+        self._basis_fn = basis
+        self._kurse_fn = kurse
+        self._lock = threading.Lock()
+        self._generation = 0  # erhöht bei jeder Invalidierung
+        self._basis: dict | None = None
+        self._gebaut = 0.0    # time.monotonic() des letzten Aufbaus
+        self._stand = 0       # time.time_ns() des letzten Aufbaus – Teil des ETags
+        self._kurse: dict[tuple[int, str, int], dict | None] = {}
+        self._antworten: dict[tuple, tuple[str, bytes]] = {}
+        self._laufend: dict[tuple, Future] = {}
+        self._listener = False
+
+    def invalidieren(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._basis = None
+
+    def _einmal(self, schluessel: tuple, fabrik: Callable[[], object]):
+        """Berechnet `fabrik()` je Schlüssel nur in einem Thread gleichzeitig."""
+        with self._lock:
+            flug = self._laufend.get(schluessel)
+            eigen = flug is None
+            if eigen:
+                flug = self._laufend[schluessel] = Future()
+        if eigen:
+            try:
+                flug.set_result(fabrik())
+            except BaseException as exc:
+                flug.set_exception(exc)
+            finally:
+                with self._lock:
+                    del self._laufend[schluessel]
+        return flug.result()
+
+    def _basis_bauen(self, generation: int) -> tuple[int, dict]:
+        basis = self._basis_fn()
+        stand = time.time_ns()
+        with self._lock:
+            # Während des Aufbaus invalidiert: Ergebnis nur für diese Anfragen nutzen
+            if generation == self._generation:
+                self._basis, self._gebaut, self._stand = basis, time.monotonic(), stand
+                self._kurse.clear()
+                self._antworten.clear()
+        return stand, basis
+
+    def _aktuelle_basis(self) -> tuple[int, dict]:
+        """(Stand, Basisdaten) – neu gebaut, falls invalidiert oder zu alt."""
+        with self._lock:
+            if self._basis is not None and time.monotonic() - self._gebaut < MAX_AGE_SEC:
+                return self._stand, self._basis
+            generation = self._generation
+        return self._einmal(("basis", generation), lambda: self._basis_bauen(generation))
+
+    def _kursverlauf(self, stand: int, aktie: str, stunden: int) -> dict | None:
+        schluessel = (stand, aktie, stunden)
+        with self._lock:
+            if schluessel in self._kurse:
+                return self._kurse[schluessel]
+
+        def laden():
+            kurse = self._kurse_fn(aktie, stunden)
+            with self._lock:
+                if stand == self._stand:
+                    self._kurse[schluessel] = kurse
+            return kurse
+
+        return self._einmal(("kurse",) + schluessel, laden)
+
+    def antwort(
+        self, aktie: str | None, stunden: int, mit_kurse: bool, fmt: str, encoding: str,
+    ) -> tuple[str, bytes]:
+        """(ETag, kodierter und komprimierter Body) für die angefragte Variante."""
+        with self._lock:
+            if not self._listener:
+                on_tick(self.invalidieren)
+                self._listener = True
+        stand, basis = self._aktuelle_basis()
+        if mit_kurse and aktie is None:
+            aktie = standard_aktie(basis["empfehlungen"])
+        if not mit_kurse:
+            aktie = None
+        schluessel = (stand, aktie, stunden, fmt, encoding)
+        with self._lock:
+            if schluessel in self._antworten:
+                return self._antworten[schluessel]
+
+        def bauen() -> tuple[str, bytes]:
+            kurse = self._kursverlauf(stand, aktie, stunden) if aktie else None
+            body = _komprimieren(_kodieren({**basis, "kurse": kurse}, fmt), encoding)
+            etag = f'"{stand:x}-{zlib.crc32(repr(schluessel[1:]).encode()):08x}"'
+            with self._lock:
+                if stand == self._stand:
+                    if len(self._antworten) >= _MAX_VARIANTEN:
+                        self._antworten.clear()
+                        self._kurse.clear()
+                    self._antworten[schluessel] = (etag, body)
+            return etag, body
+
+        return self._einmal(("antwort",) + schluessel, bauen)
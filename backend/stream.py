@@ -0,0 +1,120 @@
+"""
+Server-Sent Events – Push-Kanal für das Dashboard
+
+Ein einzelner Hintergrund-Thread hält eine dedizierte PostgreSQL-Verbindung mit
+LISTEN auf dem Kanal `trader_tick` (gesendet vom Worker nach jedem Takt) und
+verteilt jedes Delta an die asyncio-Queues aller verbundenen Clients. Andere
+Module können sich per on_tick() über jeden Takt benachrichtigen lassen.
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections.abc import Callable
+
+import psycopg2
+import psycopg2.extensions
+
+from db import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "trader_tick"
+KEEPALIVE_SEC = 25   # SSE-Kommentar hält Proxys und Browser-Verbindung offen
+_QUEUE_SIZE = 16     # langsame Clients verlieren alte Deltas statt zu blockieren
+
+_clients: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+_tick_callbacks: list[Callable[[], None]] = []   # z. B. Snapshot-Invalidierung
+_lock = threading.Lock()
+_listener: threading.Thread | None = None
+
+
+def _deliver(queue: asyncio.Queue, payload: str) -> None:
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(payload)
+
+
+def _broadcast(payload: str) -> None:
+    with _lock:
+        clients = list(_clients)
+        callbacks = list(_tick_callbacks)
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as exc:
+            logger.warning("Tick-Callback fehlgeschlagen: %s", exc)
+    for loop, queue in clients:
+        loop.call_soon_threadsafe(_deliver, queue, payload)
+
+
+def _listen_forever() -> None:
+    """LISTEN-Schleife; verbindet sich nach Fehlern selbstständig neu."""
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL};")
+            logger.info("SSE-Listener aktiv (Kanal %s).", CHANNEL)
+            while True:
+                if select.select([conn], [], [], KEEPALIVE_SEC) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _broadcast(conn.notifies.pop(0).payload)
+        except Exception as exc:
+            logger.warning("SSE-Listener-Fehler: %s – Neuverbindung in 5s", exc)
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def _ensure_listener() -> None:
+    global _listener
+    with _lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen_forever, name="sse-listener", daemon=True)
+            _listener.start()
+
+
+def on_tick(callback: Callable[[], None]) -> None:
+    """Ruft `callback` (im Listener-Thread) nach jedem Worker-Takt auf."""
+    with _lock:
+        _tick_callbacks.append(callback)
+    _ensure_listener()
+
+
+def _filter_kurse(payload: str, aktien: set[str] | None) -> str:
+    """Reduziert die Kurse im Delta auf die vom Client beobachteten Ticker."""
+    if aktien is None:
+        return payload
+    data = json.loads(payload)
+    if data.get("kurse"):
+        data["kurse"] = {a: w for a, w in data["kurse"].items() if a in aktien}
+    return json.dumps(data, separators=(",", ":"))
+
+
+async def event_stream(aktien: set[str] | None):
+    """Async-Generator im SSE-Format für einen einzelnen Client."""
+    _ensure_listener()
+    client = (asyncio.get_running_loop(), asyncio.Queue(maxsize=_QUEUE_SIZE))
+    with _lock:
+        _clients.add(client)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                payload = await asyncio.wait_for(client[1].get(), timeout=KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: tick\ndata: {_filter_kurse(payload, aktien)}\n\n"
+    finally:
+        with _lock:
+            _clients.discard(client)
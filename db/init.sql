@@ -30,6 +30,9 @@ CREATE TABLE IF NOT EXISTS trades (
 
 CREATE INDEX IF NOT EXISTS idx_trades_aktie ON trades (aktie);
 CREATE INDEX IF NOT EXISTS idx_trades_eroeffnet_at ON trades (eroeffnet_at DESC);
+-- Keyset-Pagination der Trade-Historie (/trades)
+CREATE INDEX IF NOT EXISTS idx_trades_eroeffnet_at_id ON trades (eroeffnet_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_trades_aktie_eroeffnet_at_id ON trades (aktie, eroeffnet_at DESC, id DESC);
 
 -- Tabelle: empfehlungen (KNN-Ausgabe je Takt)
 CREATE TABLE IF NOT EXISTS empfehlungen (
@@ -41,6 +44,38 @@ CREATE TABLE IF NOT EXISTS empfehlungen (
 );
 
 CREATE INDEX IF NOT EXISTS idx_empfehlungen_timestamp ON empfehlungen (timestamp DESC);
+-- Keyset-Pagination der Empfehlungs-Historie (/empfehlungen/history)
+CREATE INDEX IF NOT EXISTS idx_empfehlungen_timestamp_id ON empfehlungen (timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_empfehlungen_aktie_timestamp_id ON empfehlungen (aktie, timestamp DESC, id DESC);
+
+-- Tabelle: feature_slices (Feature-Ausschnitte je Shard und Takt mit jüngstem Kurszeitpunkt, WORKER_SHARDS > 1)
+CREATE TABLE IF NOT EXISTS feature_slices (
+    takt      TIMESTAMPTZ NOT NULL,
+    shard     INTEGER     NOT NULL,
+    aktien    TEXT        NOT NULL,
+    features  TEXT        NOT NULL,
+    stand     TIMESTAMPTZ,
+    PRIMARY KEY (takt, shard)
+);
+
+-- Tabelle: feature_store (Eingabe-Tensor je Takt, float32, Reihenfolge = TICKERS)
+CREATE TABLE IF NOT EXISTS feature_store (
+    timestamp   TIMESTAMPTZ NOT NULL,
+    version     INTEGER     NOT NULL,
+    n_tickers   INTEGER     NOT NULL,
+    n_features  INTEGER     NOT NULL,
+    features    BYTEA       NOT NULL,
+    PRIMARY KEY (timestamp, version)
+);
+
+-- Tabelle: worker_heartbeat (Lebenszeichen je Worker-Shard, für /health/ready)
+CREATE TABLE IF NOT EXISTS worker_heartbeat (
+    shard         INTEGER     PRIMARY KEY,
+    host          TEXT        NOT NULL,
+    gesehen_at    TIMESTAMPTZ NOT NULL,
+    letzter_takt  TIMESTAMPTZ,
+    markt_offen   BOOLEAN     NOT NULL DEFAULT FALSE
+);
 
 -- Aggregierte View: statistik
 CREATE OR REPLACE VIEW statistik AS
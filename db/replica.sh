@@ -0,0 +1,12 @@
+#!/bin/sh
+# Lese-Replikat: beim ersten Start Basis-Backup vom Primary ziehen (-R legt
+# standby.signal und primary_conninfo an), danach als Hot Standby streamen.
+set -e
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_isready -h "$PRIMARY_HOST" -U "$POSTGRES_USER"; do
+        sleep 2
+    done
+    pg_basebackup -h "$PRIMARY_HOST" -U "$POSTGRES_USER" -D "$PGDATA" -R -X stream -c fast
+    chmod 700 "$PGDATA"
+fi
+exec postgres -c hot_standby=on -c hot_standby_feedback=on
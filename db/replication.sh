@@ -0,0 +1,7 @@
+#!/bin/sh
+# Primary: Streaming-Replikation für das Lese-Replikat (db-replica) erlauben.
+# Läuft wie init.sql nur beim ersten Start mit leerem Volume; bei bestehendem
+# Volume die Zeile einmalig von Hand in $PGDATA/pg_hba.conf ergänzen und
+# `SELECT pg_reload_conf();` ausführen.
+set -e
+echo "host replication ${POSTGRES_USER} all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,197 @@
+"""
+Kurs-Archiv – Parquet-Export abgeschlossener Handelstage
+
+Abgeschlossene Handelstage (NYSE-Kalendertage vor heute, nach Börsenschluss
+auch heute) werden aus `kurse` in eine Parquet-Datei je Tag exportiert,
+partitioniert nach Monat:
+
+  ARCHIVE_DIR/kurse/2024-05/2024-05-13.parquet
+  Spalten: timestamp (UTC, µs), aktie (dictionary-kodiert), wert (float64)
+
+Tage ohne Kurse (Feiertage) erhalten stattdessen eine leere Markierung
+2024-05-27.leer, damit sie nicht bei jedem Export erneut abgefragt werden.
+Wer einen solchen Tag nachträglich befüllt, löscht die Markierung.
+
+Der Loader liest nur die Dateien des angefragten Zeitraums (Pruning über den
+Dateinamen), öffnet sie per Memory-Mapping und filtert Zeilen/Spalten in Arrow,
+ohne die Produktionsdatenbank zu berühren:
+
+  from archive import load, load_matrix
+  table = load(von, bis, aktien=["AAPL", "MSFT"], columns=["timestamp", "wert"])
+  ts, aktien, matrix = load_matrix(von, bis)   # NumPy (Zeit × Ticker)
+
+Export manuell: python archive.py [--tage 70]; im Worker täglich nach Börsenschluss.
+"""
+
+import argparse
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import text
+
+from db import engine
+from tickers import TICKERS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(os.environ.get("ARCHIVE_DIR", "/app/archive")) / "kurse"
+_NYSE_TZ = ZoneInfo("America/New_York")
+_LOOKBACK_TAGE = 70  # etwas mehr als die 60 Tage des Backfills
+_ABGESCHLOSSEN = time(16, 15)  # Börsenschluss 16:00 ET plus Puffer für den letzten Takt
+
+
+def _pfad(tag: date) -> Path:
+    return ARCHIVE_DIR / f"{tag:%Y-%m}" / f"{tag:%Y-%m-%d}.parquet"
+
+
+def _leer_pfad(tag: date) -> Path:
+    return _pfad(tag).with_suffix(".leer")
+
+
+def _tag_grenzen(tag: date) -> tuple[datetime, datetime]:
+    """UTC-Grenzen eines NYSE-Kalendertags."""
+    start = datetime.combine(tag, time(0), tzinfo=_NYSE_TZ)
+    return start.astimezone(timezone.utc), (start + timedelta(days=1)).astimezone(timezone.utc)
+
+
+def _export_tag(tag: date) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    von, bis = _tag_grenzen(tag)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT timestamp, aktie, wert
+                FROM kurse
+                WHERE aktie = ANY(:tickers)
+                  AND timestamp >= :von AND timestamp < :bis
+                ORDER BY aktie, timestamp
+            """),
+            {"tickers": list(TICKERS), "von": von, "bis": bis},
+        ).fetchall()
+    if not rows:
+        _leer_pfad(tag).parent.mkdir(parents=True, exist_ok=True)
+        _leer_pfad(tag).touch()
+        return 0
+
+    table = pa.table({
+        "timestamp": pa.array([r[0] for r in rows], type=pa.timestamp("us", tz="UTC")),
+        "aktie": pa.array([r[1] for r in rows], type=pa.string()).dictionary_encode(),
+        "wert": pa.array([float(r[2]) for r in rows], type=pa.float64()),
+    })
+    pfad = _pfad(tag)
+    pfad.parent.mkdir(parents=True, exist_ok=True)
+    tmp = pfad.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, pfad)
+    return len(rows)
+
+
+def export_closed_days(tage: int = _LOOKBACK_TAGE) -> int:
+    """Exportiert alle noch nicht archivierten abgeschlossenen Handelstage."""
+    jetzt = datetime.now(_NYSE_TZ)
+    heute = jetzt.date()
+    # Nach Börsenschluss ist auch der heutige Tag abgeschlossen
+    bis = 0 if jetzt.time() >= _ABGESCHLOSSEN else 1
+    exportiert = 0
+    for offset in range(tage, bis - 1, -1):
+        tag = heute - timedelta(days=offset)
+        if tag.weekday() >= 5 or _pfad(tag).exists() or _leer_pfad(tag).exists():
+            continue
+        try:
+            n = _export_tag(tag)
+        except Exception as exc:
+            logger.warning("Archiv-Export für %s fehlgeschlagen: %s", tag, exc)
+            continue
+        if n:
+            exportiert += 1
+            logger.info("Archiviert: %s (%d Kurse).", tag, n)
+        else:
+            logger.info("Keine Kurse am %s – als leer markiert.", tag)
+    return exportiert
+
+
+# ── Loader ────────────────────────────────────────────────────────────────────
+def _dateien(von: datetime, bis: datetime) -> list[str]:
+    """Parquet-Dateien, deren Handelstag den Zeitraum [von, bis) schneidet."""
+    tag = von.astimezone(_NYSE_TZ).date()
+    letzter = bis.astimezone(_NYSE_TZ).date()
+    dateien = []
+    while tag <= letzter:
+        pfad = _pfad(tag)
+        if pfad.exists():
+            dateien.append(str(pfad))
+        tag += timedelta(days=1)
+    return dateien
+
+
+def load(
+    von: datetime, bis: datetime,
+    aktien: list[str] | None = None, columns: list[str] | None = None,
+):
+    """
+    Liest Kurse mit von <= timestamp < bis als pyarrow.Table (memory-mapped).
+    `aktien` und `columns` schränken Zeilen bzw. Spalten ein.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as fs
+
+    schema = pa.schema([
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("aktie", pa.dictionary(pa.int32(), pa.string())),
+        ("wert", pa.float64()),
+    ])
+    dateien = _dateien(von, bis)
+    if not dateien:
+        return schema.empty_table().select(columns or schema.names)
+
+    filt = (pc.field("timestamp") >= pa.scalar(von, schema.field("timestamp").type)) & (
+        pc.field("timestamp") < pa.scalar(bis, schema.field("timestamp").type)
+    )
+    if aktien:
+        filt &= pc.field("aktie").isin(aktien)
+    dataset = ds.dataset(
+        dateien, schema=schema, format="parquet",
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+    return dataset.to_table(columns=columns, filter=filt)
+
+
+def load_matrix(
+    von: datetime, bis: datetime, aktien: list[str] | None = None,
+) -> tuple[np.ndarray, list[str], np.ndarray]:
+    """
+    Kurse als NumPy-Matrix (Zeit × Ticker, NaN wo kein Kurs):
+    Rückgabe (Zeitstempel datetime64[us], Ticker-Liste, Matrix float64).
+    """
+    table = load(von, bis, aktien, columns=["timestamp", "aktie", "wert"])
+    ts = table.column("timestamp").to_numpy()
+    codes = table.column("aktie").combine_chunks().dictionary_encode()
+    namen = codes.dictionary.to_pylist()
+    idx_t = codes.indices.to_numpy()
+    zeiten, idx_z = np.unique(ts, return_inverse=True)
+    matrix = np.full((len(zeiten), len(namen)), np.nan)
+    matrix[idx_z, idx_t] = table.column("wert").to_numpy()
+    reihenfolge = [n for n in (aktien or TICKERS) if n in namen]
+    spalten = [namen.index(n) for n in reihenfolge]
+    return zeiten, reihenfolge, matrix[:, spalten]
+
+
+def main() -> None:
+    _level = getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
+    logging.basicConfig(level=_level, format="%(asctime)s %(levelname)s %(name)s – %(message)s")
+    parser = argparse.ArgumentParser(description="Abgeschlossene Handelstage nach Parquet exportieren")
+    parser.add_argument("--tage", type=int, default=_LOOKBACK_TAGE)
+    args = parser.parse_args()
+    logger.info("%d Handelstage archiviert.", export_closed_days(args.tage))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 import logging
 import os
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 from sqlalchemy import BigInteger, Column, Numeric, String, UniqueConstraint, create_engine, text
+from sqlalchemy.engine import Connection
 from sqlalchemy.dialects.postgresql import TIMESTAMP
 from sqlalchemy.orm import DeclarativeBase, Session
 
@@ -11,9 +15,13 @@ engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
 logger = logging.getLogger(__name__)
 
+# Verbindung und Nach-Commit-Aktionen des laufenden Takts (je Thread/Kontext)
+_takt_conn: ContextVar[Connection | None] = ContextVar("takt_conn", default=None)
+_takt_hooks: ContextVar[list[Callable[[], None]] | None] = ContextVar("takt_hooks", default=None)
+
 
 def run_migrations() -> None:
-    """Fügt fehlende Spalten zur trades-Tabelle hinzu (idempotent)."""
+    """Fügt fehlende Spalten und Indizes hinzu (idempotent)."""
     with engine.connect() as conn:
         conn.execute(text(
             "ALTER TABLE trades ADD COLUMN IF NOT EXISTS einstiegskurs NUMERIC(12, 6)"
@@ -21,10 +29,112 @@ def run_migrations() -> None:
         conn.execute(text(
             "ALTER TABLE trades ADD COLUMN IF NOT EXISTS entry_features TEXT"
         ))
+        # Keyset-Pagination der Historien-Endpunkte im Backend
+        for ddl in (
+            "CREATE INDEX IF NOT EXISTS idx_trades_eroeffnet_at_id "
+            "ON trades (eroeffnet_at DESC, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_trades_aktie_eroeffnet_at_id "
+            "ON trades (aktie, eroeffnet_at DESC, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_empfehlungen_timestamp_id "
+            "ON empfehlungen (timestamp DESC, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_empfehlungen_aktie_timestamp_id "
+            "ON empfehlungen (aktie, timestamp DESC, id DESC)",
+        ):
+            conn.execute(text(ddl))
+        # Feature-Austausch zwischen Worker-Shards
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS feature_slices (
+                takt      TIMESTAMPTZ NOT NULL,
+                shard     INTEGER     NOT NULL,
+                aktien    TEXT        NOT NULL,
+                features  TEXT        NOT NULL,
+                stand     TIMESTAMPTZ,
+                PRIMARY KEY (takt, shard)
+            )
+        """))
+        conn.execute(text("ALTER TABLE feature_slices ADD COLUMN IF NOT EXISTS stand TIMESTAMPTZ"))
+        # Materialisierte Feature-Tensoren je Takt
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS feature_store (
+                timestamp   TIMESTAMPTZ NOT NULL,
+                version     INTEGER     NOT NULL,
+                n_tickers   INTEGER     NOT NULL,
+                n_features  INTEGER     NOT NULL,
+                features    BYTEA       NOT NULL,
+                PRIMARY KEY (timestamp, version)
+            )
+        """))
+        # Lebenszeichen der Worker (Readiness-Check im Backend)
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS worker_heartbeat (
+                shard         INTEGER     PRIMARY KEY,
+                host          TEXT        NOT NULL,
+                gesehen_at    TIMESTAMPTZ NOT NULL,
+                letzter_takt  TIMESTAMPTZ,
+                markt_offen   BOOLEAN     NOT NULL DEFAULT FALSE
+            )
+        """))
+        conn.execute(text(
+            "ALTER TABLE worker_heartbeat ADD COLUMN IF NOT EXISTS markt_offen BOOLEAN NOT NULL DEFAULT FALSE"
+        ))
         conn.commit()
     logger.info("DB-Migrationen abgeschlossen.")
 
 
+# ── Takt-Transaktion ──────────────────────────────────────────────────────────
+@contextmanager
+def takt_transaktion() -> Iterator[Connection]:
+    """
+    Eine Verbindung und eine Transaktion für die Schreibzugriffe eines Worker-Takts.
+
+    Alle Lese- und Schreibzugriffe innerhalb des Blocks, die über connection()
+    laufen, teilen sich diese Verbindung; am Blockende wird einmal committet.
+    Bei einer Exception wird alles zurückgerollt (Trades, Empfehlungen, NOTIFY)
+    und die per nach_commit() vorgemerkten Aktionen entfallen. Netzwerkzugriffe
+    und Wartezeiten gehören nicht in den Block – sie hielten Zeilensperren.
+    """
+    hooks: list[Callable[[], None]] = []
+    with engine.begin() as conn:
+        conn_token = _takt_conn.set(conn)
+        hooks_token = _takt_hooks.set(hooks)
+        try:
+            yield conn
+        finally:
+            _takt_conn.reset(conn_token)
+            _takt_hooks.reset(hooks_token)
+    for hook in hooks:
+        hook()
+
+
+@contextmanager
+def connection(savepoint: bool = False) -> Iterator[Connection]:
+    """
+    Verbindung des laufenden Takts (ohne eigenen Commit) oder – außerhalb eines
+    Takts – eine eigene Verbindung mit Commit am Blockende.
+
+    savepoint=True kapselt optionale Schreibzugriffe im Takt in einen
+    SAVEPOINT, damit ihr Fehlschlagen die Takt-Transaktion nicht abbricht.
+    """
+    conn = _takt_conn.get()
+    if conn is None:
+        with engine.begin() as own:
+            yield own
+    elif savepoint:
+        with conn.begin_nested():
+            yield conn
+    else:
+        yield conn
+
+
+def nach_commit(hook: Callable[[], None]) -> None:
+    """Führt `hook` nach dem Commit des laufenden Takts aus (ohne Takt: sofort)."""
+    hooks = _takt_hooks.get()
+    if hooks is None:
+        hook()
+    else:
+        hooks.append(hook)
+
+
 class Base(DeclarativeBase):
     pass
 
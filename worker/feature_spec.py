@@ -0,0 +1,45 @@
+"""
+Feature-Spezifikation – welche Eingaben das KNN je Aktie erhält
+
+Jedes Feature wird hier genau einmal deklariert; features.py berechnet die
+komplette Liste für alle Ticker in einem vektorisierten Durchgang, model.py
+leitet die Eingabegröße daraus ab. Ein neues Feature braucht nur einen
+weiteren Eintrag in FEATURES (und ggf. eine neue Art in features._rohwerte()).
+
+Arten (alle auf Basis der 5-Minuten-Schlusskurse):
+  delta        – Kursveränderung über `perioden` Bars
+  volatilitaet – Standardabweichung der 1-Bar-Deltas über `perioden` Bars
+  range        – Lage des Kurses in der Spanne (Min…Max) der letzten `perioden` Bars
+
+Bewusst ohne modell- oder DB-Abhängigkeiten, damit model.py sie importieren kann.
+"""
+
+from dataclasses import dataclass
+
+ARTEN = ("delta", "volatilitaet", "range")
+
+
+@dataclass(frozen=True)
+class FeatureSpec:
+    name: str
+    art: str        # siehe ARTEN
+    perioden: int   # Anzahl 5-Min-Bars
+
+
+FEATURES: tuple[FeatureSpec, ...] = (
+    FeatureSpec("delta_5m", "delta", 1),
+    FeatureSpec("delta_20m", "delta", 4),
+    FeatureSpec("delta_60m", "delta", 12),
+    FeatureSpec("volatilitaet_60m", "volatilitaet", 12),
+    FeatureSpec("range_60m", "range", 12),
+)
+
+FEATURE_NAMEN: list[str] = [f.name for f in FEATURES]
+N_FEATURES = len(FEATURES)
+
+# Mindestanzahl Kurse je Ticker im Fenster: längster Rückblick + aktueller Wert
+MIN_KURSE = max(f.perioden for f in FEATURES) + 1
+
+# Version der Feature-Definition – bei jeder Änderung an FEATURES oder der
+# Berechnung erhöhen, damit gespeicherte Tensoren (feature_store) unterscheidbar bleiben.
+FEATURE_SPEC_VERSION = 2
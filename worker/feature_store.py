@@ -0,0 +1,194 @@
+"""
+Feature-Store – materialisierte Eingabe-Tensoren je Takt
+
+Tabelle `feature_store`: ein Eintrag je Kurszeitpunkt (Zeitstempel der jüngsten
+Kursbar, aus der der Tensor berechnet wurde – live wie beim Backfill) und
+Feature-Version mit dem kompletten Tensor (N_tickers × N_features, float32, Reihenfolge = TICKERS) als
+Binärblob. Backtests, Pretraining und Debugging lesen fertige Tensoren per
+einfachem Range-Scan, statt die 7-Tage-Normalisierung aus `kurse` zu wiederholen.
+
+  - write()      – vom Worker einmal je Takt aufgerufen (Schlüssel: jüngster Kurs)
+  - load_range() – Tensoren eines Zeitraums als Array (T, N_tickers, N_features)
+  - Batch-Befüllung der Historie:
+      python feature_store.py [--tage 60] [--prozesse 4]
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+import numpy as np
+from sqlalchemy import text
+
+from db import connection, engine
+from feature_spec import FEATURE_SPEC_VERSION
+from features import WINDOW_DAYS, feature_history
+from tickers import TICKERS
+
+if TYPE_CHECKING:
+    import pandas as pd  # erst bei der ersten Verwendung geladen
+
+logger = logging.getLogger(__name__)
+
+_INSERT_CHUNK = 1000
+
+
+def _rows(timestamps, tensors: np.ndarray) -> list[dict]:
+    n, f = tensors.shape[1:]
+    return [
+        {
+            "timestamp": ts,
+            "version": FEATURE_SPEC_VERSION,
+            "n_tickers": n,
+            "n_features": f,
+            "features": np.ascontiguousarray(t, dtype=np.float32).tobytes(),
+        }
+        for ts, t in zip(timestamps, tensors)
+    ]
+
+
+def _insert(rows: list[dict]) -> int:
+    saved = 0
+    # Im Worker-Takt als SAVEPOINT: ein Fehler hier bricht den Takt nicht ab
+    with connection(savepoint=True) as conn:
+        for i in range(0, len(rows), _INSERT_CHUNK):
+            result = conn.execute(
+                text("""
+                    INSERT INTO feature_store (timestamp, version, n_tickers, n_features, features)
+                    VALUES (:timestamp, :version, :n_tickers, :n_features, :features)
+                    ON CONFLICT (timestamp, version) DO NOTHING
+                """),
+                rows[i:i + _INSERT_CHUNK],
+            )
+            saved += max(result.rowcount, 0)
+    return saved
+
+
+def write(timestamp: datetime, tensor: np.ndarray) -> None:
+    """Speichert den Tensor zum Kurszeitpunkt `timestamp`; Fehler werden nur geloggt."""
+    try:
+        _insert(_rows([timestamp], tensor[np.newaxis]))
+    except Exception as exc:
+        logger.warning("Feature-Store-Eintrag fehlgeschlagen: %s", exc)
+
+
+def load_range(
+    von: datetime, bis: datetime, version: int = FEATURE_SPEC_VERSION,
+    n_tickers: int = len(TICKERS),
+) -> tuple[pd.DatetimeIndex, np.ndarray]:
+    """
+    Alle Tensoren mit von <= timestamp < bis als Array (T, N_tickers, N_features).
+
+    Nur Einträge der Feature-Version `version` mit `n_tickers` Tickern (Standard:
+    aktuelle TICKERS-Liste) – Einträge aus der Zeit vor einer Änderung der
+    Ticker-Liste werden übergangen. Uneinheitliche Feature-Zahlen innerhalb
+    einer Version lösen einen ValueError aus.
+    """
+    import pandas as pd
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT timestamp, n_tickers, n_features, features
+                FROM feature_store
+                WHERE version = :version
+                  AND n_tickers = :n_tickers
+                  AND timestamp >= :von AND timestamp < :bis
+                ORDER BY timestamp
+            """),
+            {"version": version, "n_tickers": n_tickers, "von": von, "bis": bis},
+        ).fetchall()
+    if not rows:
+        return pd.DatetimeIndex([], tz="UTC"), np.zeros((0, n_tickers, 0), dtype=np.float32)
+    formen = {(r[1], r[2]) for r in rows}
+    if len(formen) > 1:
+        raise ValueError(
+            f"Feature-Store: uneinheitliche Tensorformen {sorted(formen)} "
+            f"für Version {version} zwischen {von} und {bis}"
+        )
+    n, f = formen.pop()
+    data = np.frombuffer(b"".join(bytes(r[3]) for r in rows), dtype=np.float32)
+    return pd.DatetimeIndex([r[0] for r in rows]), data.reshape(len(rows), n, f)
+
+
+# ── Batch-Befüllung ───────────────────────────────────────────────────────────
+def _load_prices(since: datetime) -> dict[str, pd.Series]:
+    import pandas as pd
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT aktie, timestamp, wert
+                FROM kurse
+                WHERE aktie = ANY(:tickers)
+                  AND timestamp >= :since
+                ORDER BY aktie, timestamp
+            """),
+            {"tickers": list(TICKERS), "since": since},
+        ).fetchall()
+    frame = pd.DataFrame(rows, columns=["aktie", "timestamp", "wert"])
+    frame["timestamp"] = pd.to_datetime(frame["timestamp"], utc=True)
+    frame["wert"] = frame["wert"].astype(np.float64)
+    return {
+        aktie: grp.set_index("timestamp")["wert"].rename(aktie)
+        for aktie, grp in frame.groupby("aktie", sort=False)
+    }
+
+
+def _chunk_features(args: tuple) -> np.ndarray:
+    prices_map, tickers, grid, zeitachse = args
+    return feature_history(prices_map, tickers, grid, zeitachse)[1]
+
+
+def backfill(tage: int, prozesse: int) -> int:
+    """
+    Befüllt den Feature-Store für die letzten `tage` Tage. Die Ticker werden auf
+    `prozesse` Prozesse verteilt, jeder berechnet seine Spalten vektorisiert auf
+    der Zeitachse aller Ticker – die Deltas entsprechen so der Live-Berechnung.
+    """
+    import pandas as pd
+    start = time.perf_counter()
+    since = datetime.now(timezone.utc) - timedelta(days=tage)
+    # Vorlauf von WINDOW_DAYS + 1 Tagen, damit auch die ersten Zeitpunkte ein volles Fenster haben
+    prices_map = _load_prices(since - timedelta(days=WINDOW_DAYS + 1))
+    if not prices_map:
+        logger.warning("Keine Kurse im Zeitraum – nichts zu tun.")
+        return 0
+    zeitachse = pd.DatetimeIndex(sorted(set().union(*(s.index for s in prices_map.values()))))
+    grid = zeitachse[zeitachse >= since]
+
+    chunks = [c for c in (TICKERS[i::prozesse] for i in range(prozesse)) if c]
+    jobs = [
+        ({t: prices_map[t] for t in c if t in prices_map}, c, grid, zeitachse)
+        for c in chunks
+    ]
+    with ProcessPoolExecutor(max_workers=prozesse) as pool:
+        parts = list(pool.map(_chunk_features, jobs))
+    tensors = np.zeros((len(grid), len(TICKERS), parts[0].shape[2]), dtype=np.float32)
+    for chunk, part in zip(chunks, parts):
+        tensors[:, [TICKERS.index(t) for t in chunk], :] = part
+
+    saved = _insert(_rows(grid.to_pydatetime(), tensors))
+    logger.info(
+        "Feature-Store befüllt: %d neue von %d Zeitpunkten in %.1fs.",
+        saved, len(grid), time.perf_counter() - start,
+    )
+    return saved
+
+
+def main() -> None:
+    _level = getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
+    logging.basicConfig(level=_level, format="%(asctime)s %(levelname)s %(name)s – %(message)s")
+    parser = argparse.ArgumentParser(description="Feature-Store für die Kurshistorie befüllen")
+    parser.add_argument("--tage", type=int, default=60)
+    parser.add_argument("--prozesse", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    backfill(args.tage, max(1, args.prozesse))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,43 @@
 """
 Feature Engineering – Phase 3
 
-Für jeden 5-Minuten-Takt werden drei normalisierte Deltas je Aktie berechnet:
-  delta_5m  – Kursveränderung der letzten  5 Minuten
-  delta_20m – Kursveränderung der letzten 20 Minuten
-  delta_60m – Kursveränderung der letzten 60 Minuten
+Für jeden 5-Minuten-Takt werden je Aktie die in feature_spec.FEATURES
+deklarierten Features berechnet (aktuell Deltas über 5/20/60 Minuten,
+60-Minuten-Volatilität und Lage in der 60-Minuten-Spanne).
+
+Alle Ticker und Features entstehen in einem vektorisierten Durchgang über die
+Kursmatrix (Zeit × Ticker); Zwischenergebnisse wie die Verschiebung je
+Horizont werden zwischen Features geteilt.
 
 Normalisierung: Min-Max auf [-1, 1] über ein rollendes 7-Tage-Fenster.
-  +1 → stärkstes Steigen im Fenster
-  -1 → stärkstes Fallen im Fenster
-   0 → keine Veränderung
+  +1 → höchster Wert im Fenster (z. B. stärkstes Steigen)
+  -1 → niedrigster Wert im Fenster (z. B. stärkstes Fallen)
+   0 → Mitte der Spanne bzw. keine Streuung im Fenster
 
-Ausgabe: NumPy-Tensor shape (N_tickers, 3), dtype float32 – direkt als
-         PyTorch-Eingabe verwendbar (Phase 4).
+Ausgabe: NumPy-Tensor shape (N_tickers, N_FEATURES), dtype float32 – direkt
+         als PyTorch-Eingabe verwendbar (Phase 4).
 """
 
+from __future__ import annotations
+
 import logging
+import warnings
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
 
 import numpy as np
-import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from sqlalchemy import text
 
-from db import engine
+from db import connection
+from feature_spec import FEATURE_NAMEN, FEATURES, MIN_KURSE, N_FEATURES
+from price_cache import HISTORY_DAYS, cache
 from tickers import TICKERS
 
+if TYPE_CHECKING:
+    import pandas as pd  # erst bei der ersten Verwendung geladen
+
 logger = logging.getLogger(__name__)
 
 WINDOW_DAYS = 7  # Länge des Normalisierungsfensters
@@ -34,14 +46,34 @@ WINDOW_DAYS = 7  # Länge des Normalisierungsfensters
 @dataclass
 class FeatureVector:
     aktie: str
-    delta_5m: float
-    delta_20m: float
-    delta_60m: float
+    werte: np.ndarray  # shape (N_FEATURES,), Reihenfolge wie feature_spec.FEATURES
+    stand: datetime | None = None  # Zeitpunkt des jüngsten Kurses (None ohne Kurs)
+
+    def als_dict(self) -> dict[str, float]:
+        return dict(zip(FEATURE_NAMEN, self.werte.tolist()))
 
 
 def _load_prices(tickers: list[str], days: int = WINDOW_DAYS + 1) -> dict[str, pd.Series]:
-    """Lädt alle Kurse der letzten `days` Tage je Ticker aus der DB."""
+    """
+    Liefert alle Kurse der letzten `days` Tage je Ticker – aus dem Kurs-Cache,
+    für dort fehlende Ticker (oder vor der Synchronisation) aus der DB.
+    """
     since = datetime.now(timezone.utc) - timedelta(days=days)
+    result: dict[str, pd.Series] = {}
+    if cache.ready and days <= HISTORY_DAYS:
+        for ticker in tickers:
+            series = cache.series(ticker, since)
+            if series is not None:
+                result[ticker] = series
+    missing = [t for t in tickers if t not in result]
+    if missing:
+        result.update(_load_prices_db(missing, since))
+    return result
+
+
+def _load_prices_db(tickers: list[str], since: datetime) -> dict[str, pd.Series]:
+    """Lädt alle Kurse seit `since` je Ticker aus der DB."""
+    import pandas as pd
     query = text("""
         SELECT aktie, timestamp, wert
         FROM kurse
@@ -49,7 +81,7 @@ def _load_prices(tickers: list[str], days: int = WINDOW_DAYS + 1) -> dict[str, p
           AND timestamp >= :since
         ORDER BY aktie, timestamp
     """)
-    with engine.connect() as conn:
+    with connection() as conn:
         rows = conn.execute(query, {"tickers": list(tickers), "since": since}).fetchall()
 
     grouped: dict[str, list[tuple]] = {}
@@ -66,70 +98,180 @@ def _load_prices(tickers: list[str], days: int = WINDOW_DAYS + 1) -> dict[str, p
     }
 
 
-def _delta_normalized(prices: pd.Series, periods: int) -> pd.Series:
+# ── Kursmatrix & Rohwerte ─────────────────────────────────────────────────────
+def _preismatrix(
+    prices_map: dict[str, pd.Series], tickers: list[str],
+    zeitachse: pd.DatetimeIndex | None = None,
+) -> tuple[pd.DatetimeIndex, np.ndarray]:
     """
-    Berechnet (price_now - price_N_periods_ago) für alle Zeitpunkte
-    und normalisiert das Ergebnis per Min-Max auf [-1, 1].
+    Kurse aller Ticker auf gemeinsamer Zeitachse: (Zeitachse, Array (T, N), NaN = kein Kurs).
+    Ohne `zeitachse` ist das die Vereinigung der Kurszeitpunkte von `tickers`.
+    """
+    import pandas as pd
+    vorhanden = {t: prices_map[t] for t in tickers if t in prices_map and len(prices_map[t])}
+    if not vorhanden:
+        return pd.DatetimeIndex([], tz="UTC"), np.full((0, len(tickers)), np.nan)
+    frame = pd.concat(vorhanden, axis=1).sort_index().reindex(columns=tickers)
+    if zeitachse is not None:
+        frame = frame.reindex(zeitachse)
+    return frame.index, frame.to_numpy(dtype=np.float64)
+
+
+def _ffill_innen(preise: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Füllt Lücken je Ticker mit dem letzten Kurs – nur zwischen erster und letzter
+    Beobachtung. Gibt (gefüllte Matrix, Zeile der letzten Beobachtung je Ticker,
+    -1 ohne Kurs) zurück.
+    """
+    t, n = preise.shape
+    gueltig = ~np.isnan(preise)
+    zeilen = np.arange(t)[:, np.newaxis]
+    idx = np.maximum.accumulate(np.where(gueltig, zeilen, -1), axis=0)
+    gefuellt = np.where(idx >= 0, preise[np.maximum(idx, 0), np.arange(n)], np.nan)
+    letzte = np.where(gueltig.any(axis=0), t - 1 - np.argmax(gueltig[::-1], axis=0), -1)
+    gefuellt[zeilen > letzte] = np.nan
+    return gefuellt, letzte
+
+
+def _verschoben(werte: np.ndarray, perioden: int) -> np.ndarray:
+    out = np.full_like(werte, np.nan)
+    out[perioden:] = werte[:-perioden]
+    return out
+
 
-    `periods` entspricht der Anzahl 5-Min-Schritte:
-      1 → 5 min, 4 → 20 min, 12 → 60 min
+def _rohwerte(preise: np.ndarray) -> np.ndarray:
     """
-    raw = (prices - prices.shift(periods)).dropna()
-    if len(raw) == 0:
-        return pd.Series(dtype=float)
-    mn, mx = raw.min(), raw.max()
-    if mx == mn:
-        # Alle Deltas identisch → kein Trend erkennbar → 0
-        return pd.Series(0.0, index=raw.index)
-    return 2.0 * (raw - mn) / (mx - mn) - 1.0
+    Alle Features aus FEATURES für jede Zeile der Kursmatrix (T, N) in einem
+    Durchgang: Array (T, N, N_FEATURES), NaN wo der Rückblick nicht reicht.
+    Deltas und Fenster werden je Horizont nur einmal gebildet.
+    """
+    t = len(preise)
+    out = np.full((t, preise.shape[1], N_FEATURES), np.nan)
+    deltas: dict[int, np.ndarray] = {}
+    spannen: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+    def delta(perioden: int) -> np.ndarray:
+        if perioden not in deltas:
+            deltas[perioden] = preise - _verschoben(preise, perioden)
+        return deltas[perioden]
+
+    def spanne(perioden: int) -> tuple[np.ndarray, np.ndarray]:
+        if perioden not in spannen:
+            fenster = sliding_window_view(preise, perioden + 1, axis=0)
+            spannen[perioden] = fenster.min(axis=-1), fenster.max(axis=-1)
+        return spannen[perioden]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for k, spec in enumerate(FEATURES):
+            p = spec.perioden
+            if spec.art == "delta":
+                out[:, :, k] = delta(p)
+            elif spec.art == "volatilitaet":
+                if t >= p:
+                    out[p - 1:, :, k] = sliding_window_view(delta(1), p, axis=0).std(axis=-1)
+            elif spec.art == "range":
+                if t > p:
+                    mn, mx = spanne(p)
+                    breite = mx - mn
+                    out[p:, :, k] = np.where(breite > 0, (preise[p:] - mn) / breite, 0.5)
+            else:
+                raise ValueError(f"Unbekannte Feature-Art: {spec.art}")
+    return out
 
 
+def _min_max(werte, mn, mx):
+    """Min-Max-Normalisierung auf [-1, 1]; ohne Spanne (mx == mn) → 0."""
+    spanne = mx - mn
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(spanne > 0, 2.0 * (werte - mn) / spanne - 1.0, 0.0)
+
+
+# ── Aktueller Takt ────────────────────────────────────────────────────────────
 def compute_features(tickers: list[str] = TICKERS) -> list[FeatureVector]:
     """
-    Berechnet den normalisierten Feature-Vektor [delta_5m, delta_20m, delta_60m]
-    für jeden Ticker auf Basis der letzten 7 Tage.
+    Berechnet den normalisierten Feature-Vektor (siehe feature_spec.FEATURES)
+    für jeden Ticker auf Basis der letzten 7 Tage – je Ticker zum Zeitpunkt
+    seines jüngsten Kurses.
 
-    Ticker ohne ausreichende Datenlage erhalten einen Nullvektor [0, 0, 0].
+    Ticker mit weniger als MIN_KURSE Kursen erhalten einen Nullvektor.
     """
-    prices_map = _load_prices(tickers)
-    vectors: list[FeatureVector] = []
-
-    for ticker in tickers:
-        series = prices_map.get(ticker)
-
-        # Mindestens 13 Datenpunkte nötig: 12 Perioden Shift + 1 aktueller Wert
-        if series is None or len(series) < 13:
-            logger.debug("Zu wenig Daten für %s – Nullvektor.", ticker)
-            vectors.append(FeatureVector(ticker, 0.0, 0.0, 0.0))
-            continue
-
-        try:
-            n5 = _delta_normalized(series, periods=1)   #  1 × 5 min =  5 min
-            n20 = _delta_normalized(series, periods=4)  #  4 × 5 min = 20 min
-            n60 = _delta_normalized(series, periods=12) # 12 × 5 min = 60 min
-
-            vectors.append(FeatureVector(
-                aktie=ticker,
-                delta_5m=float(n5.iloc[-1]) if len(n5) > 0 else 0.0,
-                delta_20m=float(n20.iloc[-1]) if len(n20) > 0 else 0.0,
-                delta_60m=float(n60.iloc[-1]) if len(n60) > 0 else 0.0,
-            ))
-        except Exception as exc:
-            logger.warning("Feature-Fehler für %s: %s", ticker, exc)
-            vectors.append(FeatureVector(ticker, 0.0, 0.0, 0.0))
-
-    valid = sum(1 for v in vectors if v.delta_5m != 0.0 or v.delta_20m != 0.0)
+    zeiten, preise = _preismatrix(_load_prices(tickers), tickers)
+    werte = np.zeros((len(tickers), N_FEATURES))
+    staende: list[datetime | None] = [None] * len(tickers)
+    if len(preise):
+        gefuellt, letzte = _ffill_innen(preise)
+        roh = _rohwerte(gefuellt)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # Spalten ganz ohne Werte
+            mn, mx = np.nanmin(roh, axis=0), np.nanmax(roh, axis=0)
+        aktuell = roh[np.maximum(letzte, 0), np.arange(len(tickers))]
+        werte = np.nan_to_num(_min_max(aktuell, mn, mx), nan=0.0)
+        staende = [zeiten[i].to_pydatetime() if i >= 0 else None for i in letzte]
+        zu_wenig = (~np.isnan(preise)).sum(axis=0) < MIN_KURSE
+        werte[zu_wenig] = 0.0
+        if zu_wenig.any():
+            logger.debug(
+                "Zu wenig Daten für %s – Nullvektor.",
+                ", ".join(np.asarray(tickers, dtype=object)[zu_wenig]),
+            )
+
+    vectors = [FeatureVector(t, werte[j], staende[j]) for j, t in enumerate(tickers)]
+    valid = int(werte.any(axis=1).sum())
     logger.info("Features berechnet: %d/%d Ticker mit Daten.", valid, len(tickers))
     return vectors
 
 
 def build_tensor(vectors: list[FeatureVector]) -> np.ndarray:
     """
-    Baut den Eingabe-Tensor shape (N_tickers, 3) aus den Feature-Vektoren.
+    Baut den Eingabe-Tensor shape (N_tickers, N_FEATURES) aus den Feature-Vektoren.
     Reihenfolge entspricht der TICKERS-Liste.
     dtype float32 – direkt als PyTorch-Input verwendbar.
     """
-    return np.array(
-        [[v.delta_5m, v.delta_20m, v.delta_60m] for v in vectors],
-        dtype=np.float32,
-    )
+    if not vectors:
+        return np.zeros((0, N_FEATURES), dtype=np.float32)
+    return np.stack([v.werte for v in vectors]).astype(np.float32)
+
+
+# ── Historische Features (Batch) ──────────────────────────────────────────────
+def feature_history(
+    prices_map: dict[str, pd.Series], tickers: list[str] = TICKERS,
+    grid: pd.DatetimeIndex | None = None, zeitachse: pd.DatetimeIndex | None = None,
+) -> tuple[pd.DatetimeIndex, np.ndarray]:
+    """
+    Feature-Tensor für jeden historischen Kurszeitpunkt in einem Durchgang:
+    Rückgabe (Zeitachse, Array shape (T, N_tickers, N_FEATURES), float32).
+
+    Entspricht compute_features() zu jedem Zeitpunkt t: Die Min-Max-Normalisierung
+    läuft als zeitbasiertes Rolling-Fenster über WINDOW_DAYS + 1 Tage, Ticker ohne
+    Kurs zu t übernehmen ihren letzten Feature-Wert, Ticker mit weniger als
+    MIN_KURSE Kursen im Fenster erhalten einen Nullvektor.
+
+    `grid` legt die Zeitachse der Ausgabe fest (Standard: Vereinigung aller
+    Kurszeitpunkte). `zeitachse` ist die Achse der Berechnung – die Deltas zählen
+    Zeilen dieser Achse. Wer die Ticker aufteilt, übergibt hier die Vereinigung
+    über alle Ticker, damit die Werte denen von compute_features(TICKERS) gleichen.
+    """
+    import pandas as pd
+    zeiten, preise = _preismatrix(prices_map, tickers, zeitachse)
+    if grid is None:
+        grid = zeiten
+    if not len(zeiten):
+        return grid, np.zeros((len(grid), len(tickers), N_FEATURES), dtype=np.float32)
+
+    t, n = preise.shape
+    window = f"{WINDOW_DAYS + 1}D"
+    gefuellt, letzte = _ffill_innen(preise)
+    roh = pd.DataFrame(_rohwerte(gefuellt).reshape(t, n * N_FEATURES), index=zeiten)
+    rolling = roh.rolling(window)
+    norm = _min_max(roh.to_numpy(), rolling.min().to_numpy(), rolling.max().to_numpy())
+    norm = np.nan_to_num(norm, nan=0.0).reshape(t, n, N_FEATURES)
+
+    genug = pd.DataFrame(~np.isnan(preise), index=zeiten).rolling(window).sum().to_numpy()
+    norm[genug < MIN_KURSE] = 0.0
+    # Nach dem letzten Kurs eines Tickers gilt dessen letzter Feature-Wert weiter
+    nach_ende = np.arange(t)[:, np.newaxis] > letzte
+    norm[nach_ende] = norm[np.maximum(letzte, 0), np.arange(n)][np.nonzero(nach_ende)[1]]
+
+    out = pd.DataFrame(norm.reshape(t, -1), index=zeiten)
+    out = out.reindex(grid, method="ffill").fillna(0.0).to_numpy(dtype=np.float32)
+    return grid, out.reshape(len(grid), n, N_FEATURES)
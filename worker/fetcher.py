@@ -1,81 +1,281 @@
+from __future__ import annotations
+
 import logging
+import os
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING
 
-import yfinance as yf
+import numpy as np
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from db import Kurs, engine
+from db import Kurs, connection
+from price_cache import cache
 from tickers import TICKERS
 
+if TYPE_CHECKING:
+    import pandas as pd  # erst bei der ersten Verwendung geladen
+
 logger = logging.getLogger(__name__)
 
+# ── Fetch-Scheduler ───────────────────────────────────────────────────────────
+# Jeder Ticker wird einzeln per yf.Ticker(t).history() geladen – yf.download()
+# ist nicht threadsicher (modulglobale Ergebnis-Dicts in yfinance.shared). Die
+# Abrufe laufen auf einem dauerhaften Pool mit FETCH_MAX_WORKERS Threads; jeder
+# Ticker hat ab seinem Start ein eigenes Zeitlimit. Ein hängender Abruf belegt
+# höchstens seinen Thread weiter, neue Threads entstehen dafür nicht. Nach einer
+# Runde werden nur die fehlenden Ticker erneut angefragt.
+_MAX_WORKERS = int(os.environ.get("FETCH_MAX_WORKERS", "4"))
+_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", "30"))  # Sekunden je Ticker
 _MAX_RETRIES = 3
-_RETRY_BASE_DELAY = 2  # Sekunden (exponentielles Backoff: 2, 4, 8)
+_RETRY_BASE_DELAY = 2  # Sekunden (exponentielles Backoff: 2, 4)
+
+# Circuit Breaker: nach N Abrufen ohne jeglichen Kurs pausiert der Abruf
+_BREAKER_THRESHOLD = 3
+_BREAKER_COOLDOWN = 15 * 60  # Sekunden
+_breaker_failures = 0
+_breaker_open_until = 0.0
+
+# Zuletzt per fetch_current() abgerufene Bars je Ticker: (Bar-Zeitpunkt, Schlusskurs)
+_letzte_kurse: dict[str, tuple[datetime, float]] = {}
+
+
+_pool = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix="fetch")
+_haengend: dict[str, Future] = {}   # Ticker mit überfälligem, noch laufendem Abruf
+
+
+def _download_ticker(ticker: str, interval: str, period: str) -> pd.DataFrame:
+    """Lädt einen Ticker; Spalten als MultiIndex (Ticker, Feld) wie bei yf.download()."""
+    import pandas as pd
+    import yfinance as yf  # erst beim ersten Abruf – spart Importzeit beim Start
+
+    data = yf.Ticker(ticker).history(
+        interval=interval,
+        period=period,
+        auto_adjust=True,
+        actions=False,
+        timeout=_TIMEOUT,
+        raise_errors=True,
+    )
+    return pd.concat({ticker: data}, axis=1)
+
+
+def _runde(tickers: list[str], interval: str, period: str) -> tuple[list[pd.DataFrame], list[str]]:
+    """
+    Eine Abrufrunde über den Pool: (Frames mit Daten, fehlende Ticker).
+    Überfällige Abrufe zählen als fehlend und bleiben in `_haengend`, bis sie
+    von selbst enden; solange wird ihr Ticker nicht erneut angefragt.
+    """
+    for t, fut in list(_haengend.items()):
+        if fut.done():
+            del _haengend[t]
+    frei = _MAX_WORKERS - len(_haengend)
+    if frei <= 0:
+        logger.error("Alle %d Abruf-Threads hängen – Runde übersprungen.", _MAX_WORKERS)
+        return [], list(tickers)
+
+    gestartet: dict[str, float] = {}
+
+    def laden(t: str) -> pd.DataFrame:
+        gestartet[t] = time.monotonic()
+        return _download_ticker(t, interval, period)
+
+    futures = {_pool.submit(laden, t): t for t in tickers if t not in _haengend}
+    frames: list[pd.DataFrame] = []
+    failed = [t for t in tickers if t in _haengend]
+    offen = set(futures)
+    while offen:
+        done, offen = wait(offen, timeout=1, return_when=FIRST_COMPLETED)
+        for fut in done:
+            t = futures[fut]
+            try:
+                data = fut.result()
+            except Exception as exc:
+                logger.debug("Abruf-Fehler %s: %s", t, exc)
+                failed.append(t)
+                continue
+            if _received(data, [t]):
+                frames.append(data)
+            else:
+                failed.append(t)
+        jetzt = time.monotonic()
+        for fut in list(offen):
+            t = futures[fut]
+            if t in gestartet and jetzt - gestartet[t] > _TIMEOUT:
+                logger.warning("Abruf-Timeout %s (%.0fs).", t, _TIMEOUT)
+                offen.discard(fut)
+                _haengend[t] = fut
+                failed.append(t)
+        # Sind alle Threads durch hängende Abrufe belegt, startet nichts mehr
+        if offen and len(_haengend) >= _MAX_WORKERS:
+            for fut in offen:
+                fut.cancel()
+                failed.append(futures[fut])
+            logger.error("Alle %d Abruf-Threads hängen – %d Ticker abgebrochen.",
+                         _MAX_WORKERS, len(offen))
+            break
+    return frames, failed
+
+
+def _received(data: pd.DataFrame, tickers: list[str]) -> set[str]:
+    """Ticker aus `tickers`, für die `data` mindestens einen Schlusskurs enthält."""
+    present = set(data.columns.get_level_values(0))
+    return {
+        t for t in tickers
+        if t in present and (t, "Close") in data.columns and data[(t, "Close")].notna().any()
+    }
+
+
+def _breaker_allows() -> bool:
+    if time.monotonic() < _breaker_open_until:
+        logger.warning("Circuit Breaker offen – Kursabruf übersprungen.")
+        return False
+    return True
+
+
+def _breaker_record(success: bool) -> None:
+    global _breaker_failures, _breaker_open_until
+    if success:
+        _breaker_failures = 0
+        return
+    _breaker_failures += 1
+    if _breaker_failures >= _BREAKER_THRESHOLD:
+        _breaker_open_until = time.monotonic() + _BREAKER_COOLDOWN
+        _breaker_failures = 0
+        logger.error(
+            "%d Abrufe ohne Daten – Circuit Breaker für %d min geöffnet.",
+            _BREAKER_THRESHOLD, _BREAKER_COOLDOWN // 60,
+        )
+
 
+def _download_all(tickers: list[str], interval: str, period: str) -> pd.DataFrame:
+    """
+    Lädt alle Ticker parallel mit Retry nur für fehlende Ticker.
+    Gibt die zusammengeführten Teilergebnisse zurück (auch bei Teilerfolg);
+    wirft RuntimeError, wenn gar keine Daten ankamen oder der Breaker offen ist.
+    """
+    import pandas as pd
+    if not _breaker_allows():
+        raise RuntimeError("Circuit Breaker offen")
 
-def _download_with_retry(tickers: list[str], interval: str, period: str) -> object:
-    """yfinance-Download mit exponentiellem Retry bei Fehlern."""
-    last_exc: Exception | None = None
+    frames: list[pd.DataFrame] = []
+    pending = list(tickers)
     for attempt in range(_MAX_RETRIES):
-        try:
-            data = yf.download(
-                tickers=tickers,
-                interval=interval,
-                period=period,
-                group_by="ticker",
-                auto_adjust=True,
-                progress=False,
-                threads=True,
+        neu, pending = _runde(pending, interval, period)
+        frames.extend(neu)
+        if not pending:
+            break
+        if attempt < _MAX_RETRIES - 1:
+            delay = _RETRY_BASE_DELAY ** (attempt + 1)
+            logger.warning(
+                "%d Ticker fehlen (Versuch %d/%d) – Retry in %ds",
+                len(pending), attempt + 1, _MAX_RETRIES, delay,
             )
-            return data
-        except Exception as exc:
-            last_exc = exc
-            if attempt < _MAX_RETRIES - 1:
-                delay = _RETRY_BASE_DELAY ** (attempt + 1)
-                logger.warning(
-                    "Download-Fehler (Versuch %d/%d): %s – Retry in %ds",
-                    attempt + 1, _MAX_RETRIES, exc, delay,
-                )
-                time.sleep(delay)
-            else:
-                logger.error("Alle %d Versuche fehlgeschlagen: %s", _MAX_RETRIES, exc)
-    raise last_exc
-
-
-def _parse(data, tickers: list[str]) -> list[dict]:
-    """Extrahiert Kurs-Zeilen aus einem yfinance-DataFrame."""
-    rows = []
-    is_multi = len(tickers) > 1
-    for ticker in tickers:
-        try:
-            df = data[ticker] if is_multi else data
-            df = df.dropna(subset=["Close"])
-            if df.empty:
-                logger.debug("Keine Daten für %s.", ticker)
-                continue
-            for ts, row in df.iterrows():
-                rows.append({
-                    "timestamp": ts.to_pydatetime(),
-                    "aktie": ticker,
-                    "wert": float(row["Close"]),
-                })
-        except Exception as exc:
-            logger.warning("Parse-Fehler für %s: %s", ticker, exc)
-    return rows
-
-
-def _store(rows: list[dict]) -> int:
-    """Speichert Kurs-Zeilen per INSERT … ON CONFLICT DO NOTHING."""
-    if not rows:
-        return 0
-    with engine.connect() as conn:
-        stmt = pg_insert(Kurs.__table__).values(rows)
-        stmt = stmt.on_conflict_do_nothing(
-            index_elements=["aktie", "timestamp"]
+            time.sleep(delay)
+
+    if pending:
+        logger.error("Keine Daten nach %d Versuchen für: %s", _MAX_RETRIES, ", ".join(pending))
+    _breaker_record(bool(frames))
+    if not frames:
+        raise RuntimeError("Kein Ticker lieferte Daten")
+    return pd.concat(frames, axis=1)
+
+
+# ── Spaltenweises Parsen ─────────────────────────────────────────────────────
+@dataclass
+class KursBlock:
+    """Geparste Schlusskurse als parallele Arrays (eine Zeile je Kurs)."""
+    timestamps: pd.DatetimeIndex
+    aktien: np.ndarray   # dtype object, Ticker-Symbole
+    werte: np.ndarray    # dtype float64
+
+    def __len__(self) -> int:
+        return len(self.werte)
+
+    def to_rows(self) -> list[dict]:
+        """Zeilen im Format für INSERT … VALUES."""
+        return [
+            {"timestamp": ts, "aktie": a, "wert": w}
+            for ts, a, w in zip(
+                self.timestamps.to_pydatetime(), self.aktien.tolist(), self.werte.tolist()
+            )
+        ]
+
+
+def _close_matrix(data: pd.DataFrame, tickers: list[str]) -> pd.DataFrame:
+    """Close-Ebene des MultiIndex-Frames als Matrix (Zeit × Ticker)."""
+    close = data.xs("Close", axis=1, level=1)
+    close = close[[t for t in tickers if t in close.columns]]
+    if close.index.tz is None:
+        close.index = close.index.tz_localize("UTC")
+    return close
+
+
+def _parse(data: pd.DataFrame, tickers: list[str]) -> KursBlock:
+    """
+    Extrahiert alle Schlusskurse aus einem yfinance-DataFrame in einem Durchgang:
+    Close-Ebene stapeln, NaNs einmalig verwerfen.
+    """
+    close = _close_matrix(data, tickers)
+    values = close.to_numpy(dtype=np.float64)
+    mask = ~np.isnan(values)
+    rows_idx, cols_idx = np.nonzero(mask)
+    missing = close.columns[~mask.any(axis=0)]
+    if len(missing):
+        logger.debug("Keine Daten für %s.", ", ".join(missing))
+    return KursBlock(
+        timestamps=close.index[rows_idx],
+        aktien=close.columns.to_numpy(dtype=object)[cols_idx],
+        werte=values[rows_idx, cols_idx],
+    )
+
+
+def _last_valid(data: pd.DataFrame, tickers: list[str]) -> KursBlock:
+    """Letzter gültiger Schlusskurs je Ticker (vektorisiert über alle Spalten)."""
+    import pandas as pd
+    close = _close_matrix(data, tickers)
+    if close.empty:
+        return KursBlock(
+            pd.DatetimeIndex([], tz="UTC"), np.array([], dtype=object), np.array([]),
         )
-        result = conn.execute(stmt)
-        conn.commit()
-    saved = result.rowcount if result.rowcount >= 0 else len(rows)
+    values = close.to_numpy(dtype=np.float64)
+    mask = ~np.isnan(values)
+    has_data = mask.any(axis=0)
+    # Index der letzten True-Zeile je Spalte: argmax auf der umgekehrten Maske
+    last_row = len(values) - 1 - np.argmax(mask[::-1], axis=0)
+    cols_idx = np.nonzero(has_data)[0]
+    rows_idx = last_row[cols_idx]
+    return KursBlock(
+        timestamps=close.index[rows_idx],
+        aktien=close.columns.to_numpy(dtype=object)[cols_idx],
+        werte=values[rows_idx, cols_idx],
+    )
+
+
+_INSERT_CHUNK = 5000  # Zeilen je INSERT-Statement
+
+
+def _store(block: KursBlock) -> int:
+    """
+    Speichert Kurse per INSERT … ON CONFLICT DO NOTHING in einer eigenen
+    Transaktion (vor der Takt-Transaktion, siehe main._takt) und übernimmt sie
+    nach dem Commit in den Kurs-Cache.
+    """
+    if not len(block):
+        return 0
+    rows = block.to_rows()
+    saved = 0
+    with connection() as conn:
+        for i in range(0, len(rows), _INSERT_CHUNK):
+            stmt = pg_insert(Kurs.__table__).values(rows[i:i + _INSERT_CHUNK])
+            stmt = stmt.on_conflict_do_nothing(
+                index_elements=["aktie", "timestamp"]
+            )
+            result = conn.execute(stmt)
+            saved += result.rowcount if result.rowcount >= 0 else len(rows[i:i + _INSERT_CHUNK])
+    cache.update(block.timestamps, block.aktien, block.werte)
     logger.info("%d Kurs-Einträge gespeichert (von %d).", saved, len(rows))
     return saved
 
@@ -84,37 +284,28 @@ def fetch_current(tickers: list[str] = TICKERS) -> int:
     """Aktuellsten 5-Minuten-Schlusskurs je Ticker abrufen und speichern."""
     logger.info("Kursabruf für %d Ticker (interval=5m, period=1d)…", len(tickers))
     try:
-        data = _download_with_retry(tickers, interval="5m", period="1d")
+        data = _download_all(tickers, interval="5m", period="1d")
     except Exception:
         return 0
 
-    rows: list[dict] = []
-    is_multi = len(tickers) > 1
-    for ticker in tickers:
-        try:
-            df = data[ticker] if is_multi else data
-            df = df.dropna(subset=["Close"])
-            if df.empty:
-                continue
-            last_ts = df.index[-1]
-            last_close = float(df["Close"].iloc[-1])
-            rows.append({
-                "timestamp": last_ts.to_pydatetime(),
-                "aktie": ticker,
-                "wert": last_close,
-            })
-        except Exception as exc:
-            logger.warning("Kein Kurs für %s: %s", ticker, exc)
+    block = _last_valid(data, tickers)
+    _letzte_kurse.clear()
+    _letzte_kurse.update(zip(
+        block.aktien.tolist(), zip(block.timestamps.to_pydatetime(), block.werte.tolist()),
+    ))
+    return _store(block)
+
 
-    return _store(rows)
+def letzte_kurse() -> dict[str, tuple[datetime, float]]:
+    """(Bar-Zeitpunkt, Schlusskurs) des letzten fetch_current()-Aufrufs je Ticker."""
+    return dict(_letzte_kurse)
 
 
 def backfill(tickers: list[str] = TICKERS) -> int:
     """Historische 5-Minuten-Kurse der letzten 60 Tage initial laden."""
     logger.info("Backfill für %d Ticker (interval=5m, period=60d)…", len(tickers))
     try:
-        data = _download_with_retry(tickers, interval="5m", period="60d")
+        data = _download_all(tickers, interval="5m", period="60d")
     except Exception:
         return 0
-    rows = _parse(data, tickers)
-    return _store(rows)
+    return _store(_parse(data, tickers))
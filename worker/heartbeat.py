@@ -0,0 +1,47 @@
+"""
+Worker-Heartbeat – Lebenszeichen für den Readiness-Check des Backends
+
+Jeder Job-Lauf schreibt je Shard eine Zeile in `worker_heartbeat`:
+  gesehen_at   – letzter Job-Lauf (auch bei geschlossenem Markt)
+  letzter_takt – Zeitpunkt des letzten erfolgreich committeten Takts
+  markt_offen  – ob beim letzten Job-Lauf Handelszeit war; nur dann erwartet
+                 der Readiness-Check einen frischen `letzter_takt`
+
+Im Takt läuft das UPSERT in dessen Transaktion: `letzter_takt` wird damit nur
+sichtbar, wenn der Takt tatsächlich gespeichert wurde.
+"""
+
+import logging
+import socket
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from db import connection
+from sharding import mein_shard
+
+logger = logging.getLogger(__name__)
+
+_HOST = socket.gethostname()
+
+
+def melde(takt_ok: bool = False, markt_offen: bool = True) -> None:
+    """Aktualisiert den Heartbeat; takt_ok=True setzt zusätzlich `letzter_takt`."""
+    jetzt = datetime.now(timezone.utc)
+    try:
+        with connection(savepoint=True) as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO worker_heartbeat (shard, host, gesehen_at, letzter_takt, markt_offen)
+                    VALUES (:shard, :host, :jetzt, :takt, :markt_offen)
+                    ON CONFLICT (shard) DO UPDATE SET
+                        host         = EXCLUDED.host,
+                        gesehen_at   = EXCLUDED.gesehen_at,
+                        markt_offen  = EXCLUDED.markt_offen,
+                        letzter_takt = COALESCE(EXCLUDED.letzter_takt, worker_heartbeat.letzter_takt)
+                """),
+                {"shard": mein_shard(), "host": _HOST, "jetzt": jetzt,
+                 "takt": jetzt if takt_ok else None, "markt_offen": markt_offen},
+            )
+    except Exception as exc:
+        logger.warning("Heartbeat fehlgeschlagen: %s", exc)
@@ -7,23 +7,31 @@ Lädt das TraderNet, führt den Forward-Pass durch und liefert:
 
 Checkpoint und letzte Empfehlungen werden im Docker-Volume /app/models
 persistiert, sodass der Backend-Container sie lesen kann (Phase 6).
+
+torch und das TraderNet werden erst beim ersten Modellzugriff importiert, damit
+der Worker-Start nicht auf den (mehrsekündigen) torch-Import wartet.
 """
 
+from __future__ import annotations
+
 import json
 import logging
 import os
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
 
+from typing import TYPE_CHECKING
+
 import numpy as np
-import torch
 from sqlalchemy import text
 
-from db import engine
-from model import TraderNet
+from db import connection, nach_commit
 from tickers import TICKERS
 
+if TYPE_CHECKING:
+    from model import TraderNet
+
 logger = logging.getLogger(__name__)
 
 _MODEL_DIR = Path(os.environ.get("MODEL_DIR", "/app/models"))
@@ -32,15 +40,20 @@ LATEST_PATH = _MODEL_DIR / "latest_empfehlungen.json"
 
 # Singleton – einmal laden, danach wiederverwenden
 _model: TraderNet | None = None
+_checkpoint_mtime: float | None = None  # mtime des zuletzt geladenen/geschriebenen Checkpoints
 
 
 def get_model() -> TraderNet:
     """Gibt das Singleton-Modell zurück; lädt Checkpoint falls vorhanden."""
-    global _model
+    global _model, _checkpoint_mtime
     if _model is None:
+        import torch
+        from model import TraderNet
+
         _model = TraderNet()
         if CHECKPOINT_PATH.exists():
             try:
+                _checkpoint_mtime = CHECKPOINT_PATH.stat().st_mtime
                 _model.load_state_dict(
                     torch.load(CHECKPOINT_PATH, map_location="cpu", weights_only=True)
                 )
@@ -56,12 +69,48 @@ def get_model() -> TraderNet:
 
 
 def save_checkpoint() -> None:
-    """Speichert den aktuellen Modellzustand als Checkpoint."""
+    """
+    Speichert den aktuellen Modellzustand als Checkpoint. Atomar per
+    Umbenennen, damit parallel lesende Prozesse nie eine halbe Datei sehen.
+    """
+    global _checkpoint_mtime
+    import torch
+
     _MODEL_DIR.mkdir(parents=True, exist_ok=True)
-    torch.save(get_model().state_dict(), CHECKPOINT_PATH)
+    tmp = CHECKPOINT_PATH.with_suffix(".pt.tmp")
+    torch.save(get_model().state_dict(), tmp)
+    os.replace(tmp, CHECKPOINT_PATH)
+    _checkpoint_mtime = CHECKPOINT_PATH.stat().st_mtime
     logger.info("Checkpoint gespeichert: %s", CHECKPOINT_PATH)
 
 
+def reload_checkpoint_if_changed() -> bool:
+    """
+    Lädt den Checkpoint neu, wenn ihn ein anderer Prozess seit dem letzten
+    Laden/Speichern überschrieben hat. Gibt True zurück, wenn neu geladen wurde.
+    """
+    global _checkpoint_mtime
+    import torch
+
+    model = get_model()
+    try:
+        mtime = CHECKPOINT_PATH.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    if mtime == _checkpoint_mtime:
+        return False
+    try:
+        model.load_state_dict(
+            torch.load(CHECKPOINT_PATH, map_location="cpu", weights_only=True)
+        )
+    except Exception as exc:
+        logger.warning("Checkpoint-Neuladen fehlgeschlagen: %s", exc)
+        return False
+    _checkpoint_mtime = mtime
+    logger.debug("Checkpoint neu geladen: %s", CHECKPOINT_PATH)
+    return True
+
+
 @dataclass
 class Empfehlung:
     aktie: str
@@ -73,22 +122,25 @@ class Inferenzresultat:
     long_top10: list[Empfehlung]
     short_top10: list[Empfehlung]
     raw_output: np.ndarray  # shape (90,) – wird für RL in Phase 5 benötigt
+    timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 def run_inference(tensor: np.ndarray) -> Inferenzresultat:
     """
     Forward-Pass durch das TraderNet.
 
-    tensor : NumPy-Array shape (90, 3) aus features.build_tensor()
+    tensor : NumPy-Array shape (N_tickers, N_FEATURES) aus features.build_tensor()
     Gibt Top-10-Long- und Top-10-Short-Empfehlungen zurück.
     Alle 90 Aktien werden in einem einzigen Matrix-Multiplikations-Schritt
     verarbeitet – kein sequenzieller Loop.
     """
+    import torch
+
     model = get_model()
     model.eval()
 
     with torch.no_grad():
-        x = torch.from_numpy(tensor.flatten()).unsqueeze(0).float()  # (1, 270)
+        x = torch.from_numpy(tensor.flatten()).unsqueeze(0).float()  # (1, INPUT_SIZE)
         output: np.ndarray = model(x).squeeze(0).numpy()             # (90,)
 
     # Paare (ticker, wert) nach KNN-Ausgabe sortieren
@@ -113,8 +165,9 @@ def run_inference(tensor: np.ndarray) -> Inferenzresultat:
         short_top10=short_top10,
         raw_output=output,
     )
-    _save_latest(result)
     _save_to_db(result)
+    # JSON-Backup erst nach dem Commit – bei Rollback bleibt es beim Vorgänger
+    nach_commit(lambda: _save_latest(result))
     return result
 
 
@@ -129,24 +182,28 @@ def _save_latest(result: Inferenzresultat) -> None:
 
 
 def _save_to_db(result: Inferenzresultat) -> None:
-    """Schreibt die aktuellen Empfehlungen in die Tabelle `empfehlungen`."""
-    ts = datetime.now(timezone.utc)
-    rows = [
-        {"timestamp": ts, "aktie": e.aktie, "richtung": "long", "knn_wert": e.wert}
-        for e in result.long_top10
-    ] + [
-        {"timestamp": ts, "aktie": e.aktie, "richtung": "short", "knn_wert": e.wert}
-        for e in result.short_top10
+    """
+    Schreibt die aktuellen Empfehlungen in die Tabelle `empfehlungen` (ein
+    Statement). Fehler brechen den Takt ab, damit Empfehlungen und die daraus
+    eröffneten Trades nur gemeinsam gespeichert werden.
+    """
+    empfehlungen = [(e, "long") for e in result.long_top10] + [
+        (e, "short") for e in result.short_top10
     ]
-    try:
-        with engine.connect() as conn:
-            conn.execute(
-                text("""
-                    INSERT INTO empfehlungen (timestamp, aktie, richtung, knn_wert)
-                    VALUES (:timestamp, :aktie, :richtung, :knn_wert)
-                """),
-                rows,
-            )
-            conn.commit()
-    except Exception as exc:
-        logger.warning("Empfehlungen konnten nicht in DB geschrieben werden: %s", exc)
+    with connection() as conn:
+        conn.execute(
+            text("""
+                INSERT INTO empfehlungen (timestamp, aktie, richtung, knn_wert)
+                SELECT :timestamp, aktie, richtung, knn_wert
+                FROM unnest(
+                    CAST(:aktien AS TEXT[]), CAST(:richtungen AS TEXT[]),
+                    CAST(:werte AS NUMERIC[])
+                ) AS e(aktie, richtung, knn_wert)
+            """),
+            {
+                "timestamp": result.timestamp,
+                "aktien": [e.aktie for e, _ in empfehlungen],
+                "richtungen": [r for _, r in empfehlungen],
+                "werte": [e.wert for e, _ in empfehlungen],
+            },
+        )
@@ -1,16 +1,31 @@
 import logging
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
+import startup  # zuerst importieren: markiert den Beginn der Importphase
 from apscheduler.schedulers.blocking import BlockingScheduler
 from sqlalchemy import text
 
-from db import engine, run_migrations
+import feature_store
+import heartbeat
+import profiling
+import sharding
+from archive import export_closed_days
+from db import engine, run_migrations, takt_transaktion
 from features import build_tensor, compute_features
-from fetcher import backfill, fetch_current
-from inference import CHECKPOINT_PATH, get_model, run_inference, save_checkpoint
+from fetcher import backfill, fetch_current, letzte_kurse
+from inference import (
+    CHECKPOINT_PATH, get_model, reload_checkpoint_if_changed, run_inference, save_checkpoint,
+)
 from market_hours import is_market_open
-from trader import check_and_close_trades, load_offene_trades, open_trades
+from notify import publish_tick
+from price_cache import sync_with_db
+from standby import folge_leader
+from trader import (
+    RL_EXTERN, check_and_close_trades, lerne_aus_fremden_trades, load_offene_trades, open_trades,
+)
 
 # Logging-Level aus Umgebungsvariable lesen (Standard: INFO)
 _level = getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
@@ -44,45 +59,157 @@ def _wait_for_db(max_retries: int = 12, delay: int = 5) -> None:
 def job_kurs_abruf() -> None:
     if not is_market_open():
         logger.info("Markt geschlossen – Abruf übersprungen.")
+        heartbeat.melde(markt_offen=False)
         return
+    sharding.pruefe_lock()
+    takt = sharding.aktueller_takt()
+    tickers = sharding.meine_tickers()
+    koordinator = sharding.is_coordinator()
+    try:
+        with profiling.takt(f"worker-{sharding.mein_shard()}"):
+            _takt(takt, tickers, koordinator)
+    except Exception as exc:
+        logger.error("Fehler im Job-Lauf – Takt zurückgerollt: %s", exc, exc_info=True)
+        _nach_rollback(tickers)
+        heartbeat.melde()
+
+
+def _takt(takt: datetime, tickers: list[str], koordinator: bool) -> None:
+    """
+    Netzwerk-Abruf und Warten auf andere Shards laufen vor der Takt-Transaktion;
+    nur die DB-Schreibzugriffe teilen sich eine kurze Transaktion am Ende.
+    """
+    # Auch inline: sonst überschriebe das nächste RL-Update einen vortrainierten Checkpoint
+    if koordinator and reload_checkpoint_if_changed():
+        logger.info("Neue Gewichte übernommen (Trainer oder Pretraining).")
+    with profiling.stufe("kursabruf"):
+        fetch_current(tickers)               # 1. Neue Kurse laden (eigener Commit)
+    with profiling.stufe("features"):
+        vectors = compute_features(tickers)  # 2. Features berechnen
+        # Schlüssel im Feature-Store: jüngster Kurszeitpunkt (wie beim Backfill)
+        stand = max((v.stand for v in vectors if v.stand is not None), default=None)
+        tensor, stand = sharding.gesamt_tensor(takt, build_tensor(vectors), stand)
+    logger.info(
+        "Feature-Tensor: shape=%s  min=%.4f  max=%.4f",
+        tensor.shape, float(tensor.min()), float(tensor.max()),
+    )
+    result = None
+    if not koordinator:
+        with profiling.stufe("inferenz"):
+            result = sharding.warte_auf_empfehlungen(takt)
+
+    # Alle Schreibzugriffe über eine Verbindung, ein Commit am Ende
+    with takt_transaktion():
+        # 3. Offene Trades prüfen / RL-Update (inline nur beim Koordinator)
+        with profiling.stufe("trades_schliessen"):
+            geschlossen = check_and_close_trades(rl=koordinator and not RL_EXTERN)
+            if koordinator and sharding.is_sharded() and not RL_EXTERN:
+                lerne_aus_fremden_trades(tickers)
+        if koordinator:
+            with profiling.stufe("inferenz"):
+                if stand is not None:
+                    feature_store.write(stand, tensor)
+                result = run_inference(tensor)  # 4. KNN-Inferenz
+        with profiling.stufe("trades_eroeffnen"):
+            if result is not None:
+                open_trades(result, tensor, tickers)  # 5. Neue Trades eröffnen
+        # 6. Dashboards benachrichtigen (Nicht-Koordinatoren ohne Empfehlungen)
+        with profiling.stufe("publish"):
+            publish_tick(result if koordinator else None, geschlossen, letzte_kurse())
+        heartbeat.melde(takt_ok=True)
+
+
+def _nach_rollback(tickers: list[str]) -> None:
+    """
+    Gleicht das Trade-Buch nach einem zurückgerollten Takt wieder mit der DB ab
+    (enthält ggf. Trades mit verworfener DB-ID). Kurse sind davon nicht
+    betroffen – sie werden vor der Takt-Transaktion eigenständig gespeichert.
+    Inline-RL-Updates sind nicht transaktional: schließt der nächste Takt
+    dieselben Trades erneut, fließen sie ein zweites Mal ins Modell ein.
+    """
     try:
-        check_and_close_trades()          # 1. Offene Trades prüfen / RL-Update
-        fetch_current()                   # 2. Neue Kurse laden
-        vectors = compute_features()      # 3. Features berechnen
-        tensor = build_tensor(vectors)
-        logger.info(
-            "Feature-Tensor: shape=%s  min=%.4f  max=%.4f",
-            tensor.shape, float(tensor.min()), float(tensor.max()),
-        )
-        result = run_inference(tensor)    # 4. KNN-Inferenz
-        open_trades(result, tensor)       # 5. Neue Trades eröffnen
+        load_offene_trades(tickers)
     except Exception as exc:
-        logger.error("Fehler im Job-Lauf: %s", exc, exc_info=True)
+        logger.error("Abgleich nach Rollback fehlgeschlagen: %s", exc)
 
 
 # ── Einstiegspunkt ────────────────────────────────────────────────────────────
+def _load_model() -> None:
+    """Importiert torch, lädt das Modell und legt ggf. den Bootstrap-Checkpoint an."""
+    with startup.phase("model_load"):
+        get_model()
+        if not CHECKPOINT_PATH.exists():
+            save_checkpoint()
+            logger.info("Bootstrap-Checkpoint angelegt.")
+
+
+def _import_pandas() -> None:
+    """Lädt pandas vorab – Backfill, Kurs-Cache und Features brauchen es sofort danach."""
+    with startup.phase("pandas_import"):
+        import pandas  # nur laden, Verwendung in den Modulen
+
+
 def main() -> None:
+    startup.imports_fertig()
     logger.info("Worker gestartet.")
-    _wait_for_db()
+
+    # Modell (inkl. torch-Import) und pandas parallel zu DB-Wartezeit und Migrationen laden
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup")
+    model_future = pool.submit(_load_model)
+    pandas_future = pool.submit(_import_pandas)
+
+    with startup.phase("db_wait"):
+        _wait_for_db()
 
     logger.info("Führe DB-Migrationen durch…")
-    run_migrations()
+    with startup.phase("migrations"):
+        run_migrations()
+
+    model_future.result()
+    pandas_future.result()
+    pool.shutdown()
+
+    # Hot-Standby: ohne freien Lock dem Leader folgen, bis er ausfällt.
+    # Cache, Modell und Trade-Buch sind danach bereits warm.
+    warm = False
+    if not sharding.claim_shard(wait=not sharding.STANDBY):
+        with startup.phase("standby"):
+            folge_leader()
+        warm = True
+
+    if not warm:
+        logger.info("Führe initialen Backfill durch…")
+        with startup.phase("backfill"):
+            backfill(sharding.meine_tickers())
 
-    logger.info("Führe initialen Backfill durch…")
-    backfill()
+        logger.info("Synchronisiere Kurs-Cache mit DB…")
+        with startup.phase("cache_sync"):
+            sync_with_db()
 
-    # Bootstrap: Modell initialisieren und Checkpoint anlegen falls nicht vorhanden
-    get_model()
-    if not CHECKPOINT_PATH.exists():
-        save_checkpoint()
-        logger.info("Bootstrap-Checkpoint angelegt.")
+        logger.info("Lade offene Trades aus DB…")
+        with startup.phase("trades_load"):
+            load_offene_trades(sharding.meine_tickers())
 
-    logger.info("Lade offene Trades aus DB…")
-    load_offene_trades()
+    startup.report()
+    heartbeat.melde(markt_offen=is_market_open())
 
     scheduler = BlockingScheduler(timezone="UTC")
-    scheduler.add_job(job_kurs_abruf, "interval", minutes=5, id="kurs_abruf",
-                      misfire_grace_time=60)
+    if sharding.is_sharded():
+        # Alle Shards takten auf demselben 5-Minuten-Raster
+        scheduler.add_job(job_kurs_abruf, "cron", minute="*/5", id="kurs_abruf",
+                          misfire_grace_time=60)
+    else:
+        # Nach einer Übernahme sofort takten statt 5 Minuten zu warten
+        # (next_run_time=None würde den Job pausieren – daher nur bei Bedarf setzen)
+        sofort = {"next_run_time": datetime.now(timezone.utc)} if warm else {}
+        scheduler.add_job(job_kurs_abruf, "interval", minutes=5, id="kurs_abruf",
+                          misfire_grace_time=60, **sofort)
+    if sharding.is_coordinator():
+        # Nach Börsenschluss (16:00 ET) alle abgeschlossenen Handelstage einschließlich
+        # des heutigen als Parquet archivieren
+        scheduler.add_job(export_closed_days, "cron", day_of_week="mon-fri",
+                          hour=17, minute=0, timezone="America/New_York",
+                          id="archiv_export", misfire_grace_time=3600)
     logger.info("Scheduler läuft (alle 5 Minuten).")
     try:
         scheduler.start()
@@ -3,8 +3,9 @@ KNN-Architektur – Phase 4
 
 TraderNet verarbeitet alle 90 Aktien parallel in einem einzigen Forward-Pass:
 
-  Eingabe : flacher Tensor  (1, 270)  = 90 Aktien × 3 Deltas
-  Schicht 1: Linear(270 → 256) + ReLU
+  Eingabe : flacher Tensor  (1, N_TICKERS × N_FEATURES)  – Features je Aktie
+            laut feature_spec.FEATURES (aktuell 5)
+  Schicht 1: Linear(INPUT_SIZE → 256) + ReLU
   Schicht 2: Linear(256 → 128) + ReLU
   Ausgabe : Linear(128 →  90) + Tanh  → Werte in [-1, +1]
 
@@ -19,11 +20,11 @@ import os
 import torch
 import torch.nn as nn
 
+from feature_spec import N_FEATURES
 from tickers import TICKERS
 
 N_TICKERS = len(TICKERS)            # dynamisch aus tickers.py (aktuell 70)
-N_FEATURES = 3
-INPUT_SIZE = N_TICKERS * N_FEATURES  # 70 × 3 = 210
+INPUT_SIZE = N_TICKERS * N_FEATURES  # dynamisch aus feature_spec.py
 OUTPUT_SIZE = N_TICKERS              # 70
 
 
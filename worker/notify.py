@@ -0,0 +1,62 @@
+"""
+Push-Benachrichtigung je Takt – PostgreSQL NOTIFY
+
+Nach jedem erfolgreichen Takt sendet der Worker ein kompaktes JSON-Delta auf
+dem Kanal `trader_tick`. Das Backend hört per LISTEN darauf und reicht das
+Delta über Server-Sent Events (/stream) an die Dashboards weiter.
+
+Das NOTIFY läuft in der Takt-Transaktion und wird von PostgreSQL erst beim
+Commit zugestellt – Dashboards sehen also nie zurückgerollte Daten.
+
+Payload (max. 8000 Bytes – NOTIFY-Grenze von PostgreSQL):
+  {"timestamp": "...",
+   "empfehlungen": {"long": [{"aktie", "knn_wert"}], "short": [...]},
+   "geschlossen": [{"aktie", "richtung", "schliessgrund", "ergebnis_eur"}],
+   "kurse": {"AAPL": [1760538600, 123.45], ...}}
+
+`timestamp` ist der Inferenz-Zeitpunkt (null bei Shards ohne Koordinator-
+Rolle); `kurse` enthält je Ticker den Bar-Zeitpunkt (Unix-Sekunden, UTC) und
+den Schlusskurs des zuletzt abgerufenen 5-Minuten-Bars.
+"""
+
+import json
+import logging
+from datetime import datetime
+
+from sqlalchemy import text
+
+from db import connection
+from inference import Inferenzresultat
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "trader_tick"
+_MAX_PAYLOAD = 7900  # Sicherheitsabstand zur 8000-Byte-Grenze
+
+
+def publish_tick(
+    result: Inferenzresultat | None,
+    geschlossen: list[dict],
+    kurse: dict[str, tuple[datetime, float]],
+) -> None:
+    """Sendet das Takt-Delta per pg_notify; Fehler werden nur geloggt."""
+    payload: dict = {
+        "timestamp": result.timestamp.isoformat() if result else None,
+        "empfehlungen": {
+            "long": [{"aktie": e.aktie, "knn_wert": e.wert} for e in result.long_top10],
+            "short": [{"aktie": e.aktie, "knn_wert": e.wert} for e in result.short_top10],
+        } if result else None,
+        "geschlossen": geschlossen,
+        "kurse": {a: [int(ts.timestamp()), round(w, 4)] for a, (ts, w) in kurse.items()},
+    }
+    raw = json.dumps(payload, separators=(",", ":"))
+    if len(raw.encode()) > _MAX_PAYLOAD:
+        # Kurse weglassen – das Frontend lädt sie dann per /kurse nach
+        payload["kurse"] = None
+        raw = json.dumps(payload, separators=(",", ":"))
+    try:
+        with connection(savepoint=True) as conn:
+            conn.execute(text("SELECT pg_notify(:ch, :payload)"), {"ch": CHANNEL, "payload": raw})
+        logger.debug("Takt-Delta gesendet (%d Bytes).", len(raw))
+    except Exception as exc:
+        logger.warning("NOTIFY fehlgeschlagen: %s", exc)
@@ -0,0 +1,248 @@
+"""
+Offline-Pretraining – überwachtes Vortraining auf der Kurshistorie
+
+Aufruf (im Worker-Container):
+  python pretrain.py [--epochen 20] [--batch 1024] [--horizont 12] [--neu-bauen]
+
+Ablauf:
+  1. Alle Kurse aus `kurse` laden und mit features.feature_history() für jeden
+     historischen Takt den Eingabe-Tensor (N_tickers × N_FEATURES) berechnen.
+  2. Ziel je Ticker: Vorwärtsrendite über `horizont` Takte (Standard 12 = 1 h,
+     wie der Trade-Timeout), auf die Reward-Skala abgebildet:
+     clip(rendite × EINSATZ_EUR / REWARD_SCHWELLE_EUR, −1, +1).
+     Liegt der Folgekurs an einem anderen Handelstag, bleibt das Ziel leer –
+     Übernacht- und Wochenendrenditen kommen in einem Trade nicht vor.
+  3. Eingaben und Ziele als memory-mapped float32-Arrays im Modell-Volume
+     ablegen (MODEL_DIR/pretrain/), damit Training und DataLoader-Worker sie
+     ohne Kopie teilen.
+  4. Mit mehreren DataLoader-Workern und großen Mini-Batches trainieren und
+     einen mit inference.get_model() kompatiblen Checkpoint schreiben.
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+from sqlalchemy import text
+from torch.utils.data import BatchSampler, DataLoader, Dataset, SubsetRandomSampler
+
+from db import engine
+from feature_spec import FEATURE_SPEC_VERSION
+from features import feature_history
+from inference import CHECKPOINT_PATH
+from model import INPUT_SIZE, OUTPUT_SIZE, TraderNet
+from tickers import TICKERS
+from trader import EINSATZ_EUR, REWARD_SCHWELLE_EUR
+
+_level = getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
+logging.basicConfig(
+    level=_level,
+    format="%(asctime)s %(levelname)s %(name)s – %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+_NYSE_TZ = "America/New_York"
+_ZIEL_VERSION = 2   # 2: Ziele nur innerhalb eines Handelstags
+
+DATA_DIR = CHECKPOINT_PATH.parent / "pretrain"
+_X_PATH = DATA_DIR / "x.f32"
+_Y_PATH = DATA_DIR / "y.f32"
+_META_PATH = DATA_DIR / "meta.json"
+
+
+# ── Datensatz bauen ───────────────────────────────────────────────────────────
+def _load_all_prices() -> dict[str, pd.Series]:
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT aktie, timestamp, wert
+                FROM kurse
+                WHERE aktie = ANY(:tickers)
+                ORDER BY aktie, timestamp
+            """),
+            {"tickers": list(TICKERS)},
+        ).fetchall()
+    frame = pd.DataFrame(rows, columns=["aktie", "timestamp", "wert"])
+    frame["timestamp"] = pd.to_datetime(frame["timestamp"], utc=True)
+    frame["wert"] = frame["wert"].astype(np.float64)
+    return {
+        aktie: grp.set_index("timestamp")["wert"].rename(aktie)
+        for aktie, grp in frame.groupby("aktie", sort=False)
+    }
+
+
+def _targets(prices_map: dict[str, pd.Series], grid: pd.DatetimeIndex, horizont: int) -> np.ndarray:
+    """
+    Vorwärtsrendite je Ticker auf Reward-Skala; NaN, wo kein Folgekurs am
+    selben NYSE-Handelstag existiert.
+    """
+    out = np.full((len(grid), len(TICKERS)), np.nan, dtype=np.float32)
+    skala = EINSATZ_EUR / REWARD_SCHWELLE_EUR
+    for j, ticker in enumerate(TICKERS):
+        series = prices_map.get(ticker)
+        if series is None:
+            continue
+        tag = pd.Series(series.index.tz_convert(_NYSE_TZ).normalize(), index=series.index)
+        rendite = (series.shift(-horizont) / series - 1.0).where(tag.shift(-horizont) == tag)
+        out[:, j] = np.clip(rendite.reindex(grid) * skala, -1.0, 1.0).to_numpy()
+    return out
+
+
+def build_dataset(horizont: int) -> dict:
+    """Berechnet Eingaben/Ziele und schreibt sie als memmap; gibt die Metadaten zurück."""
+    start = time.perf_counter()
+    prices_map = _load_all_prices()
+    if not prices_map:
+        raise RuntimeError("Keine Kurse in der DB – zuerst Backfill ausführen.")
+    grid, x = feature_history(prices_map, TICKERS)
+    y = _targets(prices_map, grid, horizont)
+
+    # Nur Takte mit mindestens einem Ziel; fehlende Ziele → 0 (neutral)
+    keep = ~np.isnan(y).all(axis=1)
+    x, y, grid = x[keep], np.nan_to_num(y[keep], nan=0.0), grid[keep]
+
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    xm = np.memmap(_X_PATH, dtype=np.float32, mode="w+", shape=(len(x), INPUT_SIZE))
+    xm[:] = x.reshape(len(x), -1)
+    xm.flush()
+    ym = np.memmap(_Y_PATH, dtype=np.float32, mode="w+", shape=(len(y), OUTPUT_SIZE))
+    ym[:] = y
+    ym.flush()
+
+    meta = {
+        "n": int(len(x)),
+        "input_size": INPUT_SIZE,
+        "feature_spec_version": FEATURE_SPEC_VERSION,
+        "output_size": OUTPUT_SIZE,
+        "tickers": TICKERS,
+        "horizont": horizont,
+        "ziel_version": _ZIEL_VERSION,
+        "von": grid[0].isoformat(),
+        "bis": grid[-1].isoformat(),
+    }
+    _META_PATH.write_text(json.dumps(meta, indent=2))
+    logger.info(
+        "Datensatz gebaut: %d Takte (%s … %s) in %.1fs.",
+        meta["n"], meta["von"], meta["bis"], time.perf_counter() - start,
+    )
+    return meta
+
+
+def _load_meta(horizont: int) -> dict | None:
+    try:
+        meta = json.loads(_META_PATH.read_text())
+    except FileNotFoundError:
+        return None
+    passt = (
+        meta.get("tickers") == TICKERS
+        and meta.get("input_size") == INPUT_SIZE
+        and meta.get("feature_spec_version") == FEATURE_SPEC_VERSION
+        and meta.get("horizont") == horizont
+        and meta.get("ziel_version") == _ZIEL_VERSION
+    )
+    return meta if passt else None
+
+
+# ── Training ──────────────────────────────────────────────────────────────────
+class _MemmapBatches(Dataset):
+    """
+    Liefert ganze Mini-Batches (Index-Liste → Arrays) direkt aus den memmaps.
+    Jeder DataLoader-Worker öffnet die Dateien selbst (read-only, ohne Kopie).
+    """
+
+    def __init__(self, n: int) -> None:
+        self.n = n
+        self._x: np.memmap | None = None
+        self._y: np.memmap | None = None
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, indices: list[int]) -> tuple[torch.Tensor, torch.Tensor]:
+        if self._x is None:
+            self._x = np.memmap(_X_PATH, dtype=np.float32, mode="r", shape=(self.n, INPUT_SIZE))
+            self._y = np.memmap(_Y_PATH, dtype=np.float32, mode="r", shape=(self.n, OUTPUT_SIZE))
+        idx = np.sort(np.asarray(indices))
+        return torch.from_numpy(self._x[idx]), torch.from_numpy(self._y[idx])
+
+
+def _loader(n: int, indices: range, batch: int, shuffle: bool, workers: int) -> DataLoader:
+    """
+    Einmal je Training gebaut: Der BatchSampler wird bei jedem Durchlauf neu
+    iteriert (mit shuffle=True neu gemischt), die Worker-Prozesse bleiben bestehen.
+    """
+    sampler = SubsetRandomSampler(indices) if shuffle else indices
+    return DataLoader(
+        _MemmapBatches(n), sampler=BatchSampler(sampler, batch, drop_last=False), batch_size=None,
+        num_workers=workers, persistent_workers=workers > 0,
+    )
+
+
+def train(meta: dict, epochen: int, batch: int, lr: float) -> None:
+    n = meta["n"]
+    workers = max(0, (os.cpu_count() or 1) - 1)
+    torch.set_num_threads(os.cpu_count() or 1)
+
+    # Zeitlicher Split: die letzten 10 % zur Validierung (kein Blick in die Zukunft)
+    split = int(n * 0.9)
+    model = TraderNet()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    loss_fn = nn.MSELoss()
+    train_loader = _loader(n, range(split), batch, shuffle=True, workers=workers)
+    val_loader = _loader(n, range(split, n), batch, shuffle=False, workers=workers)
+
+    for epoche in range(1, epochen + 1):
+        start = time.perf_counter()
+        model.train()
+        train_loss = 0.0
+        for x, y in train_loader:
+            optimizer.zero_grad()
+            loss = loss_fn(model(x), y)
+            loss.backward()
+            optimizer.step()
+            train_loss += loss.item() * len(x)
+
+        model.eval()
+        val_loss = 0.0
+        with torch.no_grad():
+            for x, y in val_loader:
+                val_loss += loss_fn(model(x), y).item() * len(x)
+
+        logger.info(
+            "Epoche %d/%d: train=%.6f  val=%.6f  (%.1fs)",
+            epoche, epochen, train_loss / max(split, 1), val_loss / max(n - split, 1),
+            time.perf_counter() - start,
+        )
+
+    CHECKPOINT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = CHECKPOINT_PATH.with_suffix(".pt.tmp")
+    torch.save(model.state_dict(), tmp)
+    os.replace(tmp, CHECKPOINT_PATH)
+    logger.info("Vortrainierter Checkpoint gespeichert: %s", CHECKPOINT_PATH)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline-Pretraining des TraderNet")
+    parser.add_argument("--epochen", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=1024)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--horizont", type=int, default=12, help="Ziel-Horizont in 5-Min-Takten")
+    parser.add_argument("--neu-bauen", action="store_true", help="Datensatz neu berechnen")
+    args = parser.parse_args()
+
+    meta = None if args.neu_bauen else _load_meta(args.horizont)
+    if meta is None:
+        meta = build_dataset(args.horizont)
+    else:
+        logger.info("Vorhandener Datensatz: %d Takte (%s … %s).", meta["n"], meta["von"], meta["bis"])
+    train(meta, args.epochen, args.batch, args.lr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Kurs-Cache – prozessweiter Speicher der jüngsten 5-Minuten-Kurse
+
+Spaltenorientiert: je Ticker ein Ringpuffer (Zeitstempel + Wert) in zwei
+gemeinsamen NumPy-Matrizen der Form (N_tickers, KAPAZITAET). Der Puffer deckt
+das Feature-Fenster ab (WINDOW_DAYS + 1 Tage), ältere Kurse fallen heraus.
+
+Befüllt von fetcher.fetch_current() und fetcher.backfill() nach erfolgreichem
+Speichern; gelesen von features._load_prices() und trader._letzte_kurse().
+Ist der Cache (noch) nicht synchronisiert oder fehlt ein Ticker, lesen die
+Verbraucher weiterhin aus der DB.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+import numpy as np
+from sqlalchemy import text
+
+from db import engine
+from tickers import TICKERS
+
+if TYPE_CHECKING:
+    import pandas as pd  # erst bei der ersten Verwendung geladen
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DAYS = 8       # = features.WINDOW_DAYS + 1
+_BARS_PER_DAY = 78     # 09:30–16:00 ET in 5-Minuten-Schritten
+# 8 Kalendertage enthalten höchstens 6 Handelstage – großzügig aufgerundet
+KAPAZITAET = HISTORY_DAYS * _BARS_PER_DAY
+
+_NaT = np.iinfo(np.int64).min
+
+
+class PriceCache:
+    def __init__(self, tickers: list[str], capacity: int = KAPAZITAET) -> None:
+        self._index = {t: i for i, t in enumerate(tickers)}
+        self._cap = capacity
+        self._ts = np.full((len(tickers), capacity), _NaT, dtype=np.int64)  # ns seit Epoche (UTC)
+        self._val = np.zeros((len(tickers), capacity), dtype=np.float64)
+        self._pos = np.zeros(len(tickers), dtype=np.int64)   # nächste Schreibposition
+        self._len = np.zeros(len(tickers), dtype=np.int64)   # belegte Einträge
+        self._lock = threading.Lock()
+        self.ready = False
+
+    # ── Schreiben ────────────────────────────────────────────────────────────
+    def update(self, timestamps: pd.DatetimeIndex, aktien: np.ndarray, werte: np.ndarray) -> None:
+        """
+        Übernimmt Kurse (parallele Arrays). Je Ticker werden nur Zeitstempel nach
+        dem jüngsten gespeicherten angehängt – wie ON CONFLICT DO NOTHING in der DB.
+        """
+        import pandas as pd
+        if not len(werte):
+            return
+        ts_ns = _to_ns(timestamps)
+        frame = pd.DataFrame({"aktie": aktien, "ts": ts_ns, "wert": werte})
+        with self._lock:
+            for aktie, grp in frame.groupby("aktie", sort=False):
+                i = self._index.get(aktie)
+                if i is None:
+                    continue
+                grp = grp.sort_values("ts")
+                last = self._last_ts(i)
+                grp = grp[grp["ts"] > last].iloc[-self._cap:]
+                if not len(grp):
+                    continue
+                self._append(i, grp["ts"].to_numpy(), grp["wert"].to_numpy())
+
+    def replace(self, aktie: str, timestamps: pd.DatetimeIndex, werte: np.ndarray) -> None:
+        """Ersetzt den Puffer eines Tickers vollständig (z. B. nach DB-Abgleich)."""
+        i = self._index.get(aktie)
+        if i is None:
+            return
+        with self._lock:
+            self._ts[i] = _NaT
+            self._pos[i] = 0
+            self._len[i] = 0
+            ts_ns = _to_ns(timestamps)[-self._cap:]
+            if len(ts_ns):
+                self._append(i, ts_ns, np.asarray(werte, dtype=np.float64)[-self._cap:])
+
+    def _append(self, i: int, ts_ns: np.ndarray, werte: np.ndarray) -> None:
+        n = len(ts_ns)
+        slots = (self._pos[i] + np.arange(n)) % self._cap
+        self._ts[i, slots] = ts_ns
+        self._val[i, slots] = werte
+        self._pos[i] = (self._pos[i] + n) % self._cap
+        self._len[i] = min(self._len[i] + n, self._cap)
+
+    # ── Lesen ────────────────────────────────────────────────────────────────
+    def _order(self, i: int) -> np.ndarray:
+        n = self._len[i]
+        return (self._pos[i] - n + np.arange(n)) % self._cap
+
+    def _last_ts(self, i: int) -> int:
+        return int(self._ts[i, (self._pos[i] - 1) % self._cap]) if self._len[i] else _NaT
+
+    def latest(self, aktie: str) -> float | None:
+        """Jüngster Kurs oder None, falls nicht im Cache."""
+        i = self._index.get(aktie)
+        if i is None or not self._len[i]:
+            return None
+        with self._lock:
+            return float(self._val[i, (self._pos[i] - 1) % self._cap])
+
+    def latest_timestamps(self) -> dict[str, pd.Timestamp]:
+        import pandas as pd
+        with self._lock:
+            return {
+                a: pd.Timestamp(self._last_ts(i), tz="UTC")
+                for a, i in self._index.items() if self._len[i]
+            }
+
+    def series(self, aktie: str, since: datetime) -> pd.Series | None:
+        """Kursreihe ab `since` (aufsteigend) oder None, falls nicht im Cache."""
+        import pandas as pd
+        i = self._index.get(aktie)
+        if i is None or not self._len[i]:
+            return None
+        with self._lock:
+            order = self._order(i)
+            ts = self._ts[i, order]
+            val = self._val[i, order]
+        keep = ts >= _to_ns(pd.DatetimeIndex([since]))[0]
+        return pd.Series(
+            val[keep],
+            index=pd.DatetimeIndex(ts[keep], tz="UTC"),
+            name=aktie,
+        )
+
+
+def _to_ns(timestamps) -> np.ndarray:
+    import pandas as pd
+    idx = pd.DatetimeIndex(timestamps)
+    if idx.tz is None:
+        idx = idx.tz_localize("UTC")
+    return idx.tz_convert("UTC").as_unit("ns").asi8
+
+
+# Singleton – ein Cache je Worker-Prozess
+cache = PriceCache(TICKERS)
+
+
+def _load_window(tickers: list[str]) -> dict[str, tuple[pd.DatetimeIndex, np.ndarray]]:
+    import pandas as pd
+    since = datetime.now(timezone.utc) - timedelta(days=HISTORY_DAYS)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT aktie, timestamp, wert
+                FROM kurse
+                WHERE aktie = ANY(:tickers)
+                  AND timestamp >= :since
+                ORDER BY aktie, timestamp
+            """),
+            {"tickers": list(tickers), "since": since},
+        ).fetchall()
+    grouped: dict[str, list[tuple]] = {}
+    for aktie, ts, wert in rows:
+        grouped.setdefault(aktie, []).append((ts, float(wert)))
+    return {
+        aktie: (
+            pd.DatetimeIndex([t for t, _ in vals], tz="UTC"),
+            np.array([w for _, w in vals], dtype=np.float64),
+        )
+        for aktie, vals in grouped.items()
+    }
+
+
+def sync_with_db() -> None:
+    """
+    Abgleich beim Start: Der jüngste Zeitstempel je Ticker im Cache wird mit
+    der DB verglichen; abweichende oder fehlende Ticker werden aus der DB
+    nachgeladen. Danach gilt der Cache als bereit.
+    """
+    import pandas as pd
+    with engine.connect() as conn:
+        db_latest = dict(conn.execute(
+            text("""
+                SELECT aktie, MAX(timestamp)
+                FROM kurse
+                WHERE aktie = ANY(:tickers)
+                GROUP BY aktie
+            """),
+            {"tickers": list(TICKERS)},
+        ).fetchall())
+    cached = cache.latest_timestamps()
+    stale = [
+        a for a, ts in db_latest.items()
+        if a not in cached or cached[a] != pd.Timestamp(ts).tz_convert("UTC")
+    ]
+    if stale:
+        for aktie, (ts, werte) in _load_window(stale).items():
+            cache.replace(aktie, ts, werte)
+    cache.ready = True
+    logger.info(
+        "Kurs-Cache synchronisiert: %d Ticker, %d aus DB nachgeladen.",
+        len(db_latest), len(stale),
+    )
+
+
+def follow_db() -> int:
+    """
+    Übernimmt neue Kurse aus der DB, die ein anderer Prozess (Leader) seit
+    dem jüngsten Cache-Eintrag gespeichert hat. Gibt die Anzahl Zeilen zurück.
+
+    Die Untergrenze gilt je Ticker: Ein veralteter (z. B. delisteter) oder noch
+    fehlender Ticker zieht nicht alle anderen auf HISTORY_DAYS zurück.
+    """
+    import pandas as pd
+    latest = cache.latest_timestamps()
+    fallback = datetime.now(timezone.utc) - timedelta(days=HISTORY_DAYS)
+    seit = [latest[a].to_pydatetime() if a in latest else fallback for a in TICKERS]
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT k.timestamp, k.aktie, k.wert
+                FROM unnest(CAST(:tickers AS TEXT[]), CAST(:seit AS TIMESTAMPTZ[])) AS w(aktie, seit)
+                JOIN kurse k ON k.aktie = w.aktie AND k.timestamp > w.seit
+                ORDER BY k.timestamp
+            """),
+            {"tickers": list(TICKERS), "seit": seit},
+        ).fetchall()
+    if rows:
+        cache.update(
+            pd.DatetimeIndex([r[0] for r in rows]),
+            np.array([r[1] for r in rows], dtype=object),
+            np.array([float(r[2]) for r in rows], dtype=np.float64),
+        )
+    return len(rows)
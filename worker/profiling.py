@@ -0,0 +1,147 @@
+"""
+Profiling auf Abruf – cProfile und tracemalloc für die nächsten N Takte
+
+Aktivierung ohne Neu-Deployment:
+  PROFILE_TICKS=N               – die ersten N Takte nach dem Start profilieren
+  MODEL_DIR/profile/worker.anfordern
+                                – Datei mit der Zahl N; jeder Worker übernimmt
+                                  sie beim nächsten Takt, sobald sie neuer ist als
+                                  seine letzte Übernahme (geschrieben z. B. vom
+                                  Backend-Endpunkt POST /admin/profile?ziel=worker)
+
+Je profiliertem Takt entsteht MODEL_DIR/profile/worker-<shard>/<Zeitstempel>/ mit
+  <stufe>.prof        – cProfile (pstats), z. B. `python -m pstats`, snakeviz
+  <stufe>.tracemalloc – Allokations-Snapshot nach der Stufe
+                        (tracemalloc.Snapshot.load)
+  zusammenfassung.txt – Dauer je Stufe und größte Allokationszuwächse
+
+Ab Python 3.12 erfasst cProfile alle Threads (sys.monitoring), also auch den
+Thread-Pool des Kursabrufs. tracemalloc verlangsamt den Takt deutlich – nur
+gezielt einschalten. Ohne Anforderung kosten takt()/stufe() praktisch nichts.
+"""
+
+import cProfile
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Allokationen der Messung selbst ausblenden
+_FILTER = [tracemalloc.Filter(False, m.__file__) for m in (tracemalloc, cProfile)] + [
+    tracemalloc.Filter(False, __file__),
+]
+
+PROFILE_DIR = Path(os.environ.get("MODEL_DIR", "/app/models")) / "profile"
+ANFORDERUNG = PROFILE_DIR / "worker.anfordern"
+
+_FRAMES = 10   # Stacktiefe je Allokation
+_TOP = 15      # Zeilen je Stufe in der Zusammenfassung
+
+_restliche = max(0, int(os.environ.get("PROFILE_TICKS", "0")))
+_uebernommen_ns = time.time_ns()   # nur Anforderungen nach Prozessstart zählen
+_messung: "_Messung | None" = None
+
+
+def _anforderung_pruefen() -> None:
+    """Übernimmt eine neue Anforderung aus ANFORDERUNG (falls vorhanden)."""
+    global _restliche, _uebernommen_ns
+    try:
+        mtime = ANFORDERUNG.stat().st_mtime_ns
+        if mtime <= _uebernommen_ns:
+            return
+        anzahl = int(ANFORDERUNG.read_text().strip() or 0)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as exc:
+        logger.warning("Profiling-Anforderung unlesbar: %s", exc)
+        return
+    _uebernommen_ns = mtime
+    _restliche = max(0, anzahl)
+    logger.info("Profiling angefordert: die nächsten %d Takte.", _restliche)
+
+
+class _Messung:
+    def __init__(self, verzeichnis: Path) -> None:
+        self.verzeichnis = verzeichnis
+        self._zeilen: list[str] = []
+        self._start = time.perf_counter()
+        self._tracemalloc_eigen = not tracemalloc.is_tracing()
+        if self._tracemalloc_eigen:
+            tracemalloc.start(_FRAMES)
+        self._letzter = tracemalloc.take_snapshot().filter_traces(_FILTER)
+
+    @contextmanager
+    def stufe(self, name: str):
+        profil = cProfile.Profile()
+        start = time.perf_counter()
+        profil.enable()
+        try:
+            yield
+        finally:
+            profil.disable()
+            self._sichern(name, profil, time.perf_counter() - start)
+
+    def _sichern(self, name: str, profil: cProfile.Profile, dauer: float) -> None:
+        try:
+            self.verzeichnis.mkdir(parents=True, exist_ok=True)
+            profil.dump_stats(self.verzeichnis / f"{name}.prof")
+            snapshot = tracemalloc.take_snapshot().filter_traces(_FILTER)
+            snapshot.dump(str(self.verzeichnis / f"{name}.tracemalloc"))
+            zuwachs = snapshot.compare_to(self._letzter, "lineno")[:_TOP]
+            self._letzter = snapshot
+        except Exception as exc:
+            logger.warning("Profil der Stufe %s nicht gespeichert: %s", name, exc)
+            return
+        aktuell, spitze = tracemalloc.get_traced_memory()
+        self._zeilen.append(
+            f"── {name}: {dauer:.3f}s  belegt={aktuell / 1e6:.1f} MB  spitze={spitze / 1e6:.1f} MB"
+        )
+        self._zeilen.extend(f"   {z}" for z in zuwachs)
+
+    def abschliessen(self) -> None:
+        gesamt = time.perf_counter() - self._start
+        if self._tracemalloc_eigen:
+            tracemalloc.stop()
+        try:
+            self.verzeichnis.mkdir(parents=True, exist_ok=True)
+            (self.verzeichnis / "zusammenfassung.txt").write_text(
+                f"Takt gesamt: {gesamt:.3f}s (inkl. tracemalloc-Overhead)\n\n"
+                + "\n".join(self._zeilen) + "\n"
+            )
+        except OSError as exc:
+            logger.warning("Profil-Zusammenfassung nicht gespeichert: %s", exc)
+            return
+        logger.info("Takt-Profil gespeichert: %s (%.2fs)", self.verzeichnis, gesamt)
+
+
+@contextmanager
+def takt(name: str):
+    """Profiliert die Stufen des Blocks, falls ein Profil angefordert ist."""
+    global _messung, _restliche
+    _anforderung_pruefen()
+    if _restliche <= 0 or _messung is not None:
+        yield
+        return
+    _restliche -= 1
+    stempel = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    _messung = _Messung(PROFILE_DIR / name / stempel)
+    try:
+        yield
+    finally:
+        messung, _messung = _messung, None
+        messung.abschliessen()
+
+
+@contextmanager
+def stufe(name: str):
+    """Eigenes cProfile und tracemalloc-Snapshot für eine Stufe des laufenden Takts."""
+    if _messung is None:
+        yield
+        return
+    with _messung.stufe(name):
+        yield
@@ -0,0 +1,254 @@
+"""
+Horizontales Sharding – mehrere Worker teilen sich das Ticker-Universum
+
+Mit WORKER_SHARDS=N > 1 beansprucht jede Worker-Instanz beim Start per
+PostgreSQL-Advisory-Lock genau einen Shard 0…N-1 (die Lock-Verbindung bleibt
+offen, solange der Prozess lebt). Shard i besitzt TICKERS[i::N]: nur diese
+Ticker werden abgerufen, in Features überführt und gehandelt.
+
+Je Takt (auf 5-Minuten-Raster ausgerichtet):
+  1. jeder Shard schreibt seinen Feature-Ausschnitt in `feature_slices`
+  2. alle Shards setzen daraus den Gesamt-Tensor (N_tickers, N_FEATURES) zusammen
+  3. Shard 0 (Koordinator) führt die Inferenz aus und schreibt `empfehlungen`
+  4. die übrigen Shards lesen diese Empfehlungen und öffnen Trades für ihre Ticker
+
+Ohne WORKER_SHARDS (=1) sind alle Funktionen Durchreichungen und der Worker
+verhält sich wie bisher.
+
+Mit WORKER_STANDBY=1 wird der Lock auch ohne Sharding verwendet: Er dient dann
+als Leader-Lock, und ein Worker ohne freien Shard läuft als Hot-Standby
+(siehe standby.py), bis ein Lock frei wird.
+
+Die Lock-Verbindung nutzt TCP-Keepalives und tcp_user_timeout auf beiden Seiten
+(SHARD_LOCK_TIMEOUT, Standard 30 s): Nach einem Host-Absturz oder einer
+Netztrennung beendet PostgreSQL die Sitzung und gibt den Lock frei, statt
+auf den Keepalive des Betriebssystems (~2 h) zu warten.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from db import DATABASE_URL, engine
+from inference import Empfehlung, Inferenzresultat
+from tickers import TICKERS
+
+logger = logging.getLogger(__name__)
+
+SHARD_COUNT = max(1, int(os.environ.get("WORKER_SHARDS", "1")))
+STANDBY = os.environ.get("WORKER_STANDBY", "0").lower() in ("1", "true", "yes")
+_LOCK_BASE = 0x7472_0000          # Advisory-Lock-Schlüssel: Basis + Shard-Index
+_WAIT_SEC = float(os.environ.get("SHARD_WAIT_SEC", "90"))  # max. Warten auf andere Shards
+_POLL_SEC = 1.0
+_TAKT_MIN = 5
+_LOCK_TIMEOUT = max(3, int(os.environ.get("SHARD_LOCK_TIMEOUT", "30")))  # Sekunden bis zur Freigabe
+
+# Eigene Engine für die Lock-Verbindung: Keepalive 10 s Leerlauf + 3 × 5 s Proben
+# (bei 30 s), tcp_user_timeout für unbestätigte Daten – clientseitig (libpq) und
+# serverseitig (Sitzungsparameter), denn den Lock gibt nur der Server frei.
+_KEEPALIVE = {
+    "keepalives_idle": max(1, _LOCK_TIMEOUT // 3),
+    "keepalives_interval": max(1, _LOCK_TIMEOUT // 6),
+    "keepalives_count": 3,
+}
+_lock_engine = create_engine(
+    DATABASE_URL,
+    poolclass=NullPool,
+    connect_args={
+        "keepalives": 1,
+        **_KEEPALIVE,
+        "tcp_user_timeout": _LOCK_TIMEOUT * 1000,
+        "options": " ".join(
+            [f"-c tcp_{k}={v}" for k, v in _KEEPALIVE.items()]
+            + [f"-c tcp_user_timeout={_LOCK_TIMEOUT * 1000}"]
+        ),
+    },
+)
+
+_shard: int = 0
+_lock_conn = None   # hält den Advisory-Lock für die Prozesslebensdauer
+
+
+def is_sharded() -> bool:
+    return SHARD_COUNT > 1
+
+
+def is_coordinator() -> bool:
+    return _shard == 0
+
+
+def mein_shard() -> int:
+    return _shard
+
+
+def shard_tickers(shard: int) -> list[str]:
+    return TICKERS[shard::SHARD_COUNT]
+
+
+def meine_tickers() -> list[str]:
+    """Ticker dieses Workers (alle, wenn nicht geshardet)."""
+    return shard_tickers(_shard) if is_sharded() else TICKERS
+
+
+def aktueller_takt(now: datetime | None = None) -> datetime:
+    """Beginn des laufenden 5-Minuten-Takts – gemeinsamer Schlüssel aller Shards."""
+    now = now or datetime.now(timezone.utc)
+    return now.replace(minute=now.minute - now.minute % _TAKT_MIN, second=0, microsecond=0)
+
+
+# ── Shard-Zuteilung ───────────────────────────────────────────────────────────
+def claim_shard(wait: bool = True, retry_delay: int = 10) -> bool:
+    """
+    Beansprucht den ersten freien Shard. Mit wait=True wird gewartet, bis
+    einer frei ist; mit wait=False gibt es genau einen Versuch.
+    Gibt True zurück, sobald dieser Prozess einen Shard hält.
+    """
+    global _shard, _lock_conn
+    if _lock_conn is not None or not (is_sharded() or STANDBY):
+        return True
+    conn = _lock_engine.connect()
+    while True:
+        for shard in range(SHARD_COUNT):
+            got = conn.execute(
+                text("SELECT pg_try_advisory_lock(:k)"), {"k": _LOCK_BASE + shard}
+            ).scalar()
+            if got:
+                conn.commit()
+                _shard, _lock_conn = shard, conn
+                logger.info(
+                    "Shard %d/%d beansprucht (%d Ticker%s).",
+                    shard, SHARD_COUNT, len(meine_tickers()),
+                    ", Koordinator" if is_coordinator() else "",
+                )
+                return True
+        conn.rollback()
+        if not wait:
+            conn.close()
+            return False
+        logger.warning("Alle %d Shards belegt – erneuter Versuch in %ds.", SHARD_COUNT, retry_delay)
+        time.sleep(retry_delay)
+
+
+def pruefe_lock() -> None:
+    """
+    Bricht den Prozess ab, wenn die Lock-Verbindung verloren ging – der Lock
+    wäre sonst frei und ein zweiter Worker könnte denselben Shard beanspruchen.
+    """
+    if _lock_conn is None:
+        return
+    try:
+        _lock_conn.execute(text("SELECT 1"))
+        _lock_conn.commit()
+    except Exception as exc:
+        logger.critical("Shard-Lock verloren (%s) – Worker beendet sich.", exc)
+        os._exit(1)
+
+
+# ── Feature-Austausch ─────────────────────────────────────────────────────────
+def _publish_slice(takt: datetime, tensor: np.ndarray, stand: datetime | None) -> None:
+    with engine.connect() as conn:
+        conn.execute(
+            text("""
+                INSERT INTO feature_slices (takt, shard, aktien, features, stand)
+                VALUES (:takt, :shard, :aktien, :features, :stand)
+                ON CONFLICT (takt, shard) DO UPDATE
+                  SET aktien = EXCLUDED.aktien, features = EXCLUDED.features,
+                      stand = EXCLUDED.stand
+            """),
+            {
+                "takt": takt,
+                "shard": _shard,
+                "aktien": json.dumps(meine_tickers()),
+                "features": json.dumps(tensor.tolist()),
+                "stand": stand,
+            },
+        )
+        if is_coordinator():
+            conn.execute(
+                text("DELETE FROM feature_slices WHERE takt < :grenze"),
+                {"grenze": takt - timedelta(days=1)},
+            )
+        conn.commit()
+
+
+def gesamt_tensor(
+    takt: datetime, tensor: np.ndarray, stand: datetime | None,
+) -> tuple[np.ndarray, datetime | None]:
+    """
+    Setzt den Gesamt-Tensor (N_tickers, N_FEATURES) aus den Ausschnitten aller Shards
+    zusammen. Fehlt ein Shard nach SHARD_WAIT_SEC, erhalten seine Ticker einen
+    Nullvektor (wie Ticker ohne Datenlage).
+
+    `stand` ist der jüngste Kurszeitpunkt des eigenen Ausschnitts; zurückgegeben
+    wird (Gesamt-Tensor, jüngster Kurszeitpunkt aller Ausschnitte).
+    """
+    if not is_sharded():
+        return tensor, stand
+    _publish_slice(takt, tensor, stand)
+
+    deadline = time.monotonic() + _WAIT_SEC
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT aktien, features, stand FROM feature_slices WHERE takt = :takt"),
+                {"takt": takt},
+            ).fetchall()
+        if len(rows) >= SHARD_COUNT or time.monotonic() >= deadline:
+            break
+        time.sleep(_POLL_SEC)
+
+    if len(rows) < SHARD_COUNT:
+        logger.warning("Nur %d/%d Shards geliefert – Rest als Nullvektor.", len(rows), SHARD_COUNT)
+    full = np.zeros((len(TICKERS), tensor.shape[1]), dtype=np.float32)
+    index = {t: i for i, t in enumerate(TICKERS)}
+    for aktien_json, features_json, _ in rows:
+        aktien = json.loads(aktien_json)
+        features = np.array(json.loads(features_json), dtype=np.float32)
+        for aktie, row in zip(aktien, features):
+            if aktie in index:
+                full[index[aktie]] = row
+    return full, max((r[2] for r in rows if r[2] is not None), default=stand)
+
+
+def warte_auf_empfehlungen(takt: datetime) -> Inferenzresultat | None:
+    """Wartet auf die vom Koordinator für diesen Takt geschriebenen Empfehlungen."""
+    deadline = time.monotonic() + _WAIT_SEC
+    while True:
+        with engine.connect() as conn:
+            ts = conn.execute(
+                text("SELECT MAX(timestamp) FROM empfehlungen WHERE timestamp >= :takt"),
+                {"takt": takt},
+            ).scalar()
+            if ts is not None:
+                rows = conn.execute(
+                    text("""
+                        SELECT aktie, richtung, knn_wert
+                        FROM empfehlungen
+                        WHERE timestamp = :ts
+                        ORDER BY richtung, knn_wert DESC
+                    """),
+                    {"ts": ts},
+                ).fetchall()
+                break
+        if time.monotonic() >= deadline:
+            logger.warning("Keine Empfehlungen vom Koordinator für Takt %s.", takt.isoformat())
+            return None
+        time.sleep(_POLL_SEC)
+
+    long_top10 = [Empfehlung(a, float(w)) for a, r, w in rows if r == "long"]
+    short_top10 = sorted(
+        (Empfehlung(a, float(w)) for a, r, w in rows if r == "short"),
+        key=lambda e: e.wert,
+    )
+    return Inferenzresultat(
+        long_top10=long_top10,
+        short_top10=short_top10,
+        raw_output=np.zeros(len(TICKERS), dtype=np.float32),
+        timestamp=ts,
+    )
@@ -0,0 +1,51 @@
+"""
+Hot-Standby – Worker ohne Leader-Lock hält seinen Zustand warm
+
+Ein Standby-Worker (WORKER_STANDBY=1, kein freier Shard-/Leader-Lock) führt
+keine Takte aus, sondern folgt den Commits des Leaders:
+  - Kurs-Cache    : neue Zeilen aus `kurse` nachladen (price_cache.follow_db)
+  - Modellgewichte: Checkpoint neu laden, sobald der Leader ihn überschreibt
+  - Trade-Buch    : offene Trades aus `trades` neu einlesen
+
+Alle STANDBY_POLL_SEC Sekunden wird erneut versucht, den Lock zu erhalten.
+Stirbt der Leader, gibt PostgreSQL dessen Session-Lock frei, und der Standby
+übernimmt innerhalb weniger Sekunden mit bereits warmem Zustand.
+"""
+
+import logging
+import os
+import time
+
+import sharding
+from inference import get_model, reload_checkpoint_if_changed
+from price_cache import follow_db, sync_with_db
+from trader import load_offene_trades
+
+logger = logging.getLogger(__name__)
+
+_POLL_SEC = float(os.environ.get("STANDBY_POLL_SEC", "5"))
+
+
+def folge_leader() -> None:
+    """Blockiert als Standby, bis dieser Prozess einen Lock erhält."""
+    logger.info("Kein freier Lock – Worker läuft als Hot-Standby.")
+    sync_with_db()
+    get_model()
+    load_offene_trades()
+
+    while not sharding.claim_shard(wait=False):
+        try:
+            neu = follow_db()
+            if reload_checkpoint_if_changed():
+                logger.info("Standby: Modellgewichte des Leaders übernommen.")
+            load_offene_trades()
+            logger.debug("Standby: %d neue Kurse übernommen.", neu)
+        except Exception as exc:
+            logger.warning("Standby-Abgleich fehlgeschlagen: %s", exc)
+        time.sleep(_POLL_SEC)
+
+    # Letzter Abgleich direkt nach der Übernahme
+    follow_db()
+    reload_checkpoint_if_changed()
+    load_offene_trades(sharding.meine_tickers())
+    logger.info("Leader-Lock übernommen – Standby wird aktiv.")
@@ -0,0 +1,90 @@
+"""
+Start-Zeitmessung – Dauer je Startphase des Workers
+
+Wird als erstes Modul von main.py importiert; der Importzeitpunkt markiert den
+Beginn der Importphase. Schwere Bibliotheken (torch, pandas, yfinance) werden
+erst bei der ersten Verwendung geladen (siehe inference.py, trader.py,
+fetcher.py, price_cache.py, features.py); torch und pandas lädt main.py
+parallel zur DB-Wartezeit vor. numpy und SQLAlchemy bleiben direkt importiert:
+Die DB-Verbindung ist der erste Schritt des Starts.
+
+Mit STARTUP_IMPORT_AUDIT=1 wird nach dem Start zusätzlich die Importdauer
+jeder schweren Bibliothek einzeln gemessen und geloggt – je in einem frischen
+Interpreter (`python -X importtime`), da der Worker sie bis dahin längst
+geladen hat.
+"""
+
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_T0 = time.perf_counter()
+
+HEAVY_MODULES = ["numpy", "pandas", "sqlalchemy", "apscheduler", "torch", "yfinance", "pyarrow"]
+
+_phasen: list[tuple[str, float]] = []
+_lock = threading.Lock()
+
+
+def _record(name: str, dauer: float) -> None:
+    with _lock:
+        _phasen.append((name, dauer))
+
+
+def imports_fertig() -> None:
+    """Schließt die Importphase ab (Aufruf zu Beginn von main())."""
+    _record("imports", time.perf_counter() - _T0)
+
+
+@contextmanager
+def phase(name: str):
+    """Misst die Dauer des Blocks als Startphase (auch aus Threads nutzbar)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def report() -> None:
+    """Loggt alle Phasen und die Gesamtdauer seit Prozessbeginn."""
+    with _lock:
+        teile = "  ".join(f"{n}={d:.2f}s" for n, d in _phasen)
+    logger.info("Startzeiten: %s  gesamt=%.2fs", teile, time.perf_counter() - _T0)
+    if os.environ.get("STARTUP_IMPORT_AUDIT", "0").lower() in ("1", "true", "yes"):
+        import_audit()
+
+
+def _kalter_import(name: str) -> float:
+    """Kumulierte Importdauer von `name` in Sekunden, gemessen in einem frischen Interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {name}"],
+        capture_output=True, text=True, timeout=300, check=True,
+    )
+    # Zeilenformat: "import time: <self µs> | <kumuliert µs> | <Modul>"
+    for zeile in reversed(result.stderr.splitlines()):
+        teile = zeile.split("|")
+        if len(teile) == 3 and teile[2].strip() == name:
+            return int(teile[1]) / 1e6
+    raise ValueError("keine importtime-Ausgabe")
+
+
+def import_audit() -> None:
+    """Misst die Kaltstart-Importdauer jeder schweren Bibliothek einzeln."""
+    for name in HEAVY_MODULES:
+        try:
+            dauer = _kalter_import(name)
+        except subprocess.CalledProcessError as exc:
+            fehler = exc.stderr.strip().splitlines()[-1:] or [f"Exit-Code {exc.returncode}"]
+            logger.info("Import-Audit: %-12s nicht verfügbar (%s)", name, fehler[0])
+            continue
+        except (OSError, subprocess.TimeoutExpired, ValueError) as exc:
+            logger.warning("Import-Audit: %-12s fehlgeschlagen (%s)", name, exc)
+            continue
+        logger.info("Import-Audit: %-12s %.3fs", name, dauer)
@@ -6,7 +6,8 @@ Ablauf je 5-Min-Takt:
   2. open_trades(result, tensor) – neue Trades für Top-10-Long/Short öffnen
 
 Offene Trades werden in der DB persistiert (INSERT beim Öffnen, UPDATE beim
-Schließen), sodass sie Worker-Neustarts überleben.
+Schließen – je Takt ein Statement), sodass sie Worker-Neustarts überleben.
+Im Worker-Takt laufen beide über dessen Transaktion (db.takt_transaktion).
 
 Gebührenmodell (virtuell):
   Eröffnung : 0,5 % auf Einsatz (100 €) = 0,50 €
@@ -18,15 +19,16 @@ Gebührenmodell (virtuell):
 
 import json
 import logging
+import os
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 
 import numpy as np
-import torch
-import torch.nn as nn
 
-from db import engine
-from inference import Inferenzresultat, get_model, save_checkpoint
+from db import connection
+from feature_spec import N_FEATURES
+from inference import CHECKPOINT_PATH, Inferenzresultat, get_model, save_checkpoint
+from price_cache import cache
 from sqlalchemy import text
 from tickers import TICKERS
 
@@ -41,6 +43,15 @@ TIMEOUT_MIN: int = 60
 REWARD_SCHWELLE_EUR: float = 10.0
 LR: float = 1e-4
 
+# "extern": RL-Training läuft im separaten Trainer-Prozess (trainer.py),
+# der Worker übernimmt nur dessen Checkpoints.
+RL_EXTERN: bool = os.environ.get("RL_TRAINER", "inline").lower() == "extern"
+
+# Trade-Schließungen werden erst am Takt-Ende committet, und die Zeitstempel
+# stammen aus dem Python-Prozess. Watermarks über `geschlossen_at` lesen jüngere
+# Zeilen daher erst nach dieser Frist, damit keine übersprungen wird.
+COMMIT_LAG_SEC = 300
+
 
 # ── Datenstruktur ─────────────────────────────────────────────────────────────
 @dataclass
@@ -59,13 +70,36 @@ _offene_trades: list[OffenerTrade] = []
 
 
 # ── Hilfsfunktionen ───────────────────────────────────────────────────────────
-def _letzter_kurs(aktie: str) -> float | None:
-    with engine.connect() as conn:
-        row = conn.execute(
-            text("SELECT wert FROM kurse WHERE aktie = :a ORDER BY timestamp DESC LIMIT 1"),
-            {"a": aktie},
-        ).fetchone()
-    return float(row[0]) if row else None
+def _letzte_kurse(aktien: list[str]) -> dict[str, float]:
+    """Jüngster Kurs je Aktie aus dem Kurs-Cache, fehlende in einer DB-Abfrage."""
+    kurse: dict[str, float] = {}
+    if cache.ready:
+        for aktie in aktien:
+            kurs = cache.latest(aktie)
+            if kurs is not None:
+                kurse[aktie] = kurs
+    fehlend = [a for a in aktien if a not in kurse]
+    if fehlend:
+        with connection() as conn:
+            rows = conn.execute(
+                text("""
+                    SELECT DISTINCT ON (aktie) aktie, wert
+                    FROM kurse
+                    WHERE aktie = ANY(:aktien)
+                    ORDER BY aktie, timestamp DESC
+                """),
+                {"aktien": fehlend},
+            ).fetchall()
+        kurse.update((aktie, float(wert)) for aktie, wert in rows)
+    return kurse
+
+
+def _entry_tensor(entry_json: str | None) -> np.ndarray | None:
+    """Eröffnungs-Tensor aus der DB; None, wenn er fehlt oder nicht zur Feature-Spezifikation passt."""
+    if not entry_json:
+        return None
+    tensor = np.array(json.loads(entry_json), dtype=np.float32)
+    return tensor if tensor.shape == (len(TICKERS), N_FEATURES) else None
 
 
 def _netto_pnl(trade: OffenerTrade, kurs: float) -> float:
@@ -87,64 +121,77 @@ def _reward_signal(ergebnis: float, schliessgrund: str) -> float | None:
     return max(-1.0, min(1.0, ergebnis / REWARD_SCHWELLE_EUR))
 
 
-def _oeffne_trade_db(trade: OffenerTrade) -> int:
-    """INSERT offenen Trade in DB; gibt die neue DB-ID zurück."""
-    with engine.connect() as conn:
-        row = conn.execute(
+def _oeffne_trades_db(trades: list[OffenerTrade]) -> None:
+    """INSERT der neuen Trades in einem Statement; setzt jeweils die DB-ID."""
+    with connection() as conn:
+        rows = conn.execute(
             text("""
                 INSERT INTO trades
                   (aktie, richtung, eroeffnet_at, einstiegskurs,
                    einsatz_eur, gebuehr_eroeffnung_eur, entry_features)
-                VALUES
-                  (:aktie, :richtung, :eroeffnet_at, :einstiegskurs,
-                   :einsatz, :geb_oe, :entry_features)
-                RETURNING id
+                SELECT aktie, richtung, :eroeffnet_at, einstiegskurs,
+                       :einsatz, :geb_oe, entry_features
+                FROM unnest(
+                    CAST(:aktien AS TEXT[]), CAST(:richtungen AS TEXT[]),
+                    CAST(:kurse AS NUMERIC[]), CAST(:features AS TEXT[])
+                ) AS n(aktie, richtung, einstiegskurs, entry_features)
+                RETURNING id, aktie
             """),
             {
-                "aktie": trade.aktie,
-                "richtung": trade.richtung,
-                "eroeffnet_at": trade.eroeffnet_at,
-                "einstiegskurs": trade.einstiegskurs,
+                "aktien": [t.aktie for t in trades],
+                "richtungen": [t.richtung for t in trades],
+                "kurse": [t.einstiegskurs for t in trades],
+                "features": [json.dumps(t.entry_tensor.tolist()) for t in trades],
+                "eroeffnet_at": trades[0].eroeffnet_at,
                 "einsatz": EINSATZ_EUR,
-                "geb_oe": trade.gebuehr_eroeffnung,
-                "entry_features": json.dumps(trade.entry_tensor.tolist()),
+                "geb_oe": EINSATZ_EUR * GEBUEHR_RATE,
             },
-        ).fetchone()
-        conn.commit()
-    return int(row[0])
+        ).fetchall()
+    ids = {aktie: db_id for db_id, aktie in rows}
+    for trade in trades:
+        trade.db_id = int(ids[trade.aktie])
 
 
-def _schliesse_trade_db(
-    db_id: int, trade: OffenerTrade, kurs: float,
-    schliessgrund: str, ergebnis: float, reward: float | None,
-) -> None:
-    """UPDATE Trade in DB mit Schließungsdaten."""
-    gebuehr_s = abs(EINSATZ_EUR * (kurs / trade.einstiegskurs)) * GEBUEHR_RATE
-    with engine.connect() as conn:
+def _schliesse_trades_db(schliessungen: list[tuple]) -> None:
+    """
+    UPDATE aller in diesem Takt geschlossenen Trades in einem Statement.
+    `schliessungen`: Tupel (trade, kurs, schliessgrund, ergebnis, reward).
+    """
+    with connection() as conn:
         conn.execute(
             text("""
                 UPDATE trades SET
                     geschlossen_at          = :geschlossen_at,
-                    schliessgrund           = :schliessgrund,
-                    gebuehr_schliessung_eur = :geb_sc,
-                    ergebnis_eur            = :ergebnis,
-                    reward                  = :reward
-                WHERE id = :id
+                    schliessgrund           = s.schliessgrund,
+                    gebuehr_schliessung_eur = s.geb_sc,
+                    ergebnis_eur            = s.ergebnis,
+                    reward                  = s.reward
+                FROM unnest(
+                    CAST(:ids AS BIGINT[]), CAST(:gruende AS TEXT[]),
+                    CAST(:geb_sc AS NUMERIC[]), CAST(:ergebnisse AS NUMERIC[]),
+                    CAST(:rewards AS NUMERIC[])
+                ) AS s(id, schliessgrund, geb_sc, ergebnis, reward)
+                WHERE trades.id = s.id
             """),
             {
-                "id": db_id,
+                "ids": [t.db_id for t, *_ in schliessungen],
+                "gruende": [grund for _, _, grund, _, _ in schliessungen],
+                "geb_sc": [
+                    abs(EINSATZ_EUR * (kurs / t.einstiegskurs)) * GEBUEHR_RATE
+                    for t, kurs, *_ in schliessungen
+                ],
+                "ergebnisse": [ergebnis for *_, ergebnis, _ in schliessungen],
+                "rewards": [reward for *_, reward in schliessungen],
                 "geschlossen_at": datetime.now(timezone.utc),
-                "schliessgrund": schliessgrund,
-                "geb_sc": gebuehr_s,
-                "ergebnis": ergebnis,
-                "reward": reward,
             },
         )
-        conn.commit()
 
 
 def _rl_update(ticker_index: int, reward: float, tensor: np.ndarray) -> None:
     """Policy-Gradient-ähnliches RL-Update auf dem geschlossenen Trade."""
+    import torch
+    import torch.nn as nn
+
     model = get_model()
     model.train()
     optimizer = torch.optim.Adam(model.parameters(), lr=LR)
@@ -169,17 +216,19 @@ def _rl_update(ticker_index: int, reward: float, tensor: np.ndarray) -> None:
 
 
 # ── Öffentliche API ───────────────────────────────────────────────────────────
-def load_offene_trades() -> None:
-    """Lädt offene Trades aus der DB (nach Worker-Neustart)."""
+def load_offene_trades(tickers: list[str] = TICKERS) -> None:
+    """Lädt offene Trades der eigenen Ticker aus der DB (nach Worker-Neustart)."""
     _offene_trades.clear()
-    with engine.connect() as conn:
+    with connection() as conn:
         rows = conn.execute(
             text("""
                 SELECT id, aktie, richtung, eroeffnet_at, einstiegskurs,
                        gebuehr_eroeffnung_eur, entry_features
                 FROM trades
                 WHERE geschlossen_at IS NULL
-            """)
+                  AND aktie = ANY(:tickers)
+            """),
+            {"tickers": list(tickers)},
         ).fetchall()
 
     for row in rows:
@@ -187,11 +236,10 @@ def load_offene_trades() -> None:
         if aktie not in TICKERS:
             logger.warning("Ticker %s nicht in TICKERS – Trade ignoriert.", aktie)
             continue
-        tensor = (
-            np.array(json.loads(entry_json), dtype=np.float32)
-            if entry_json
-            else np.zeros((len(TICKERS), 3), dtype=np.float32)
-        )
+        tensor = _entry_tensor(entry_json)
+        if tensor is None:
+            # fehlend oder aus einer älteren Feature-Spezifikation
+            tensor = np.zeros((len(TICKERS), N_FEATURES), dtype=np.float32)
         _offene_trades.append(OffenerTrade(
             aktie=aktie,
             richtung=richtung,
@@ -205,47 +253,57 @@ def load_offene_trades() -> None:
     logger.info("Offene Trades aus DB geladen: %d", len(_offene_trades))
 
 
-def open_trades(result: Inferenzresultat, tensor: np.ndarray) -> None:
-    """Öffnet virtuelle Trades für Top-10-Long und Top-10-Short."""
+def open_trades(
+    result: Inferenzresultat, tensor: np.ndarray, tickers: list[str] = TICKERS,
+) -> None:
+    """Öffnet virtuelle Trades für Top-10-Long und Top-10-Short der eigenen Ticker."""
     aktive = {t.aktie for t in _offene_trades}
-    neu = 0
-    for emp in result.long_top10 + result.short_top10:
-        if emp.aktie in aktive:
-            continue
-        richtung = "long" if emp in result.long_top10 else "short"
-        kurs = _letzter_kurs(emp.aktie)
+    eigene = set(tickers)
+    kandidaten = [
+        (emp, "long" if emp in result.long_top10 else "short")
+        for emp in result.long_top10 + result.short_top10
+        if emp.aktie not in aktive and emp.aktie in eigene
+    ]
+    if not kandidaten:
+        return
+    kurse = _letzte_kurse([emp.aktie for emp, _ in kandidaten])
+    jetzt = datetime.now(timezone.utc)
+    neue: list[OffenerTrade] = []
+    for emp, richtung in kandidaten:
+        kurs = kurse.get(emp.aktie)
         if kurs is None:
             logger.warning("Kein Kurs für %s – Trade übersprungen.", emp.aktie)
             continue
-        trade = OffenerTrade(
+        neue.append(OffenerTrade(
             aktie=emp.aktie,
             richtung=richtung,
-            eroeffnet_at=datetime.now(timezone.utc),
+            eroeffnet_at=jetzt,
             einstiegskurs=kurs,
             gebuehr_eroeffnung=EINSATZ_EUR * GEBUEHR_RATE,
             ticker_index=TICKERS.index(emp.aktie),
             entry_tensor=tensor.copy(),
-        )
-        try:
-            trade.db_id = _oeffne_trade_db(trade)
-        except Exception as exc:
-            logger.warning("Trade-Insert fehlgeschlagen für %s: %s", emp.aktie, exc)
-        _offene_trades.append(trade)
-        aktive.add(emp.aktie)
-        neu += 1
-    if neu:
-        logger.info("%d neue Trades eröffnet (gesamt offen: %d).", neu, len(_offene_trades))
-
-
-def check_and_close_trades() -> None:
-    """Überprüft alle offenen Trades; schließt und trainiert bei Bedarf."""
-    if not _offene_trades:
+        ))
+    if not neue:
         return
+    _oeffne_trades_db(neue)
+    _offene_trades.extend(neue)
+    logger.info("%d neue Trades eröffnet (gesamt offen: %d).", len(neue), len(_offene_trades))
+
+
+def check_and_close_trades(rl: bool = True) -> list[dict]:
+    """
+    Überprüft alle offenen Trades; schließt und trainiert bei Bedarf.
+    Mit rl=False wird nur geschlossen (Training übernimmt ein anderer Prozess).
+    Gibt die in diesem Takt geschlossenen Trades (kompakt) zurück.
+    """
+    if not _offene_trades:
+        return []
     jetzt = datetime.now(timezone.utc)
-    to_close: list[OffenerTrade] = []
+    kurse = _letzte_kurse([t.aktie for t in _offene_trades])
+    schliessungen: list[tuple] = []
 
     for trade in _offene_trades:
-        kurs = _letzter_kurs(trade.aktie)
+        kurs = kurse.get(trade.aktie)
         if kurs is None:
             continue
         ergebnis = _netto_pnl(trade, kurs)
@@ -260,16 +318,26 @@ def check_and_close_trades() -> None:
             schliessgrund = "timeout"
         else:
             continue
+        schliessungen.append(
+            (trade, kurs, schliessgrund, ergebnis, _reward_signal(ergebnis, schliessgrund))
+        )
 
-        reward = _reward_signal(ergebnis, schliessgrund)
-        if trade.db_id is not None:
-            try:
-                _schliesse_trade_db(trade.db_id, trade, kurs, schliessgrund, ergebnis, reward)
-            except Exception as exc:
-                logger.warning("Trade-Update fehlgeschlagen für %s: %s", trade.aktie, exc)
-        to_close.append(trade)
-
-        if reward is not None:
+    if not schliessungen:
+        return []
+    # Zuerst persistieren: schlägt das UPDATE fehl, bleibt das Trade-Buch unverändert
+    _schliesse_trades_db([s for s in schliessungen if s[0].db_id is not None])
+
+    geschlossen: list[dict] = []
+    for trade, kurs, schliessgrund, ergebnis, reward in schliessungen:
+        _offene_trades.remove(trade)
+        geschlossen.append({
+            "aktie": trade.aktie,
+            "richtung": trade.richtung,
+            "schliessgrund": schliessgrund,
+            "ergebnis_eur": round(ergebnis, 4),
+        })
+
+        if rl and reward is not None:
             _rl_update(trade.ticker_index, reward, trade.entry_tensor)
 
         logger.info(
@@ -277,6 +345,62 @@ def check_and_close_trades() -> None:
             trade.richtung.upper(), trade.aktie, schliessgrund,
             ergebnis, f"{reward:.3f}" if reward is not None else "None",
         )
+    return geschlossen
+
+
+_FREMD_STATE_PATH = CHECKPOINT_PATH.with_name("fremd_state.json")
+
+
+def _load_fremd_watermark() -> tuple[datetime, int]:
+    try:
+        data = json.loads(_FREMD_STATE_PATH.read_text())
+        return datetime.fromisoformat(data["geschlossen_at"]), int(data["id"])
+    except FileNotFoundError:
+        # Erster Start: nur künftig geschlossene Trades lernen
+        return datetime.now(timezone.utc) - timedelta(seconds=COMMIT_LAG_SEC), 0
+
+
+def _save_fremd_watermark(geschlossen_at: datetime, trade_id: int) -> None:
+    tmp = _FREMD_STATE_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"geschlossen_at": geschlossen_at.isoformat(), "id": trade_id}))
+    os.replace(tmp, _FREMD_STATE_PATH)
+
 
-    for t in to_close:
-        _offene_trades.remove(t)
+def lerne_aus_fremden_trades(eigene_tickers: list[str]) -> int:
+    """
+    RL-Update für Trades, die andere Worker-Shards seit dem letzten Aufruf
+    geschlossen haben (Reward und Eröffnungs-Tensor aus der DB).
+
+    Watermark über (geschlossen_at, id), mit COMMIT_LAG_SEC Abstand zu now()
+    und in MODEL_DIR/fremd_state.json gespeichert – auch Trades, die während
+    eines Neustarts geschlossen wurden, werden gelernt.
+    Gibt die Anzahl der Updates zurück.
+    """
+    wm_ts, wm_id = _load_fremd_watermark()
+    with connection() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT id, aktie, reward, entry_features, geschlossen_at
+                FROM trades
+                WHERE (geschlossen_at, id) > (:ts, :id)
+                  AND geschlossen_at < now() - :lag * interval '1 second'
+                  AND reward IS NOT NULL
+                  AND entry_features IS NOT NULL
+                  AND aktie <> ALL(:eigene)
+                ORDER BY geschlossen_at, id
+            """),
+            {"ts": wm_ts, "id": wm_id, "lag": COMMIT_LAG_SEC, "eigene": list(eigene_tickers)},
+        ).fetchall()
+    if not rows:
+        return 0
+
+    for _, aktie, reward, entry_json, _ in rows:
+        if aktie not in TICKERS:
+            continue
+        tensor = _entry_tensor(entry_json)
+        if tensor is not None:
+            _rl_update(TICKERS.index(aktie), float(reward), tensor)
+    # Sofort speichern: die RL-Updates sind unabhängig vom Commit des Takts wirksam
+    _save_fremd_watermark(rows[-1][4], rows[-1][0])
+    logger.info("%d RL-Updates aus Trades anderer Shards.", len(rows))
+    return len(rows)
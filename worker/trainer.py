@@ -0,0 +1,209 @@
+"""
+Trainer-Prozess – RL-Training getrennt vom Takt
+
+Mit RL_TRAINER=extern trainiert der Worker nicht mehr selbst. Stattdessen
+läuft dieser Prozess (eigener Container, gleiches Image) und
+  1. liest neu geschlossene Trades mit Reward aus der Tabelle `trades`
+     (Erfahrungen: Eröffnungs-Tensor, Ticker-Index, Reward),
+  2. trainiert in Mini-Batches über einen Replay-Puffer mit allen CPU-Kernen
+     und einem dauerhaften Optimizer,
+  3. veröffentlicht die Gewichte als Checkpoint (atomar ersetzt), den der
+     Worker zu Beginn jedes Takts per reload_checkpoint_if_changed() übernimmt.
+
+Der Fortschritt (zuletzt verarbeiteter Trade) liegt in MODEL_DIR/trainer_state.json,
+sodass Erfahrungen nach einem Neustart nicht doppelt trainiert werden.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import torch
+import torch.nn as nn
+from sqlalchemy import text
+
+from db import engine
+from feature_spec import N_FEATURES
+from inference import CHECKPOINT_PATH, get_model, reload_checkpoint_if_changed, save_checkpoint
+from tickers import TICKERS
+from trader import COMMIT_LAG_SEC, LR
+
+_level = getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
+logging.basicConfig(
+    level=_level,
+    format="%(asctime)s %(levelname)s %(name)s – %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+_STATE_PATH = CHECKPOINT_PATH.with_name("trainer_state.json")
+_POLL_SEC = float(os.environ.get("TRAINER_POLL_SEC", "10"))
+_BUFFER_SIZE = int(os.environ.get("TRAINER_BUFFER", "10000"))
+_BATCH_SIZE = int(os.environ.get("TRAINER_BATCH", "64"))
+_STEPS_PER_ROUND = int(os.environ.get("TRAINER_STEPS", "20"))
+
+
+# ── Erfahrungen ───────────────────────────────────────────────────────────────
+def _load_state() -> tuple[datetime, int]:
+    try:
+        data = json.loads(_STATE_PATH.read_text())
+        return datetime.fromisoformat(data["geschlossen_at"]), int(data["id"])
+    except FileNotFoundError:
+        # Erster Start: nur künftige Trades als neue Erfahrungen behandeln – ab der
+        # Lag-Grenze, sonst fielen die im COMMIT_LAG_SEC-Fenster geschlossenen heraus
+        return datetime.now(timezone.utc) - timedelta(seconds=COMMIT_LAG_SEC), 0
+
+
+def _save_state(geschlossen_at: datetime, trade_id: int) -> None:
+    tmp = _STATE_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"geschlossen_at": geschlossen_at.isoformat(), "id": trade_id}))
+    os.replace(tmp, _STATE_PATH)
+
+
+def _fetch_experiences(where: str, params: dict, limit: int, newest: bool = False) -> list[tuple]:
+    """Erfahrungen aufsteigend nach (geschlossen_at, id); newest=True: die jüngsten `limit`."""
+    order = "DESC" if newest else "ASC"
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"""
+                SELECT id, geschlossen_at, aktie, reward, entry_features
+                FROM trades
+                WHERE reward IS NOT NULL
+                  AND entry_features IS NOT NULL
+                  AND geschlossen_at < now() - :lag * interval '1 second'
+                  AND {where}
+                ORDER BY geschlossen_at {order}, id {order}
+                LIMIT :limit
+            """),
+            {**params, "limit": limit, "lag": COMMIT_LAG_SEC},
+        ).fetchall()
+    return rows[::-1] if newest else rows
+
+
+def _to_experience(row: tuple) -> tuple[np.ndarray, int, float] | None:
+    _, _, aktie, reward, entry_json = row
+    if aktie not in TICKERS:
+        return None
+    tensor = np.array(json.loads(entry_json), dtype=np.float32).flatten()
+    if tensor.size != len(TICKERS) * N_FEATURES:
+        return None  # Trade aus einer älteren Feature-Spezifikation
+    return tensor, TICKERS.index(aktie), float(reward)
+
+
+class _ReplayPuffer:
+    """Replay-Puffer als Ringpuffer auf einer Liste – Zufallszugriff in O(1)."""
+
+    def __init__(self, groesse: int) -> None:
+        self._groesse = groesse
+        self._eintraege: list[tuple[np.ndarray, int, float]] = []
+        self._pos = 0   # nächste Schreibposition, sobald der Puffer voll ist
+
+    def __len__(self) -> int:
+        return len(self._eintraege)
+
+    def extend(self, erfahrungen: list[tuple[np.ndarray, int, float]]) -> None:
+        for exp in erfahrungen:
+            if len(self._eintraege) < self._groesse:
+                self._eintraege.append(exp)
+            else:
+                self._eintraege[self._pos] = exp
+                self._pos = (self._pos + 1) % self._groesse
+
+    def stichprobe(self, rng: np.random.Generator, n: int) -> list[tuple[np.ndarray, int, float]]:
+        """`n` zufällige Einträge (mit Zurücklegen)."""
+        if not self._eintraege:
+            return []
+        return [self._eintraege[i] for i in rng.integers(0, len(self._eintraege), size=n)]
+
+
+# ── Training ──────────────────────────────────────────────────────────────────
+def _train_step(
+    model: nn.Module, optimizer: torch.optim.Optimizer,
+    batch: list[tuple[np.ndarray, int, float]],
+) -> float:
+    """
+    Batch-Variante des RL-Updates aus trader._rl_update(): Ziel ist die eigene
+    Ausgabe, nur am gehandelten Ticker durch den Reward ersetzt.
+    """
+    x = torch.from_numpy(np.stack([b[0] for b in batch]))
+    idx = torch.tensor([b[1] for b in batch])
+    rewards = torch.tensor([b[2] for b in batch], dtype=torch.float32)
+
+    model.train()
+    optimizer.zero_grad()
+    output = model(x)
+    target = output.detach().clone()
+    target[torch.arange(len(batch)), idx] = rewards
+    loss = nn.MSELoss()(output, target)
+    loss.backward()
+    optimizer.step()
+    model.eval()
+    return loss.item()
+
+
+def main() -> None:
+    torch.set_num_threads(os.cpu_count() or 1)
+    model = get_model()
+    if not CHECKPOINT_PATH.exists():
+        save_checkpoint()
+    optimizer = torch.optim.Adam(model.parameters(), lr=LR)
+
+    wm_ts, wm_id = _load_state()
+    # Replay-Puffer mit bereits verarbeiteten Erfahrungen vorbefüllen
+    buffer = _ReplayPuffer(_BUFFER_SIZE)
+    buffer.extend([
+        exp for exp in map(_to_experience, _fetch_experiences(
+            "(geschlossen_at, id) <= (:ts, :id)", {"ts": wm_ts, "id": wm_id},
+            _BUFFER_SIZE, newest=True,
+        ))
+        if exp is not None
+    ])
+    logger.info(
+        "Trainer gestartet (%d Threads, Replay-Puffer %d, ab %s).",
+        torch.get_num_threads(), len(buffer), wm_ts.isoformat(),
+    )
+
+    version = 0
+    rng = np.random.default_rng()
+    while True:
+        try:
+            rows = _fetch_experiences(
+                "(geschlossen_at, id) > (:ts, :id)", {"ts": wm_ts, "id": wm_id}, 1000,
+            )
+        except Exception as exc:
+            logger.warning("Erfahrungen konnten nicht gelesen werden: %s", exc)
+            time.sleep(_POLL_SEC)
+            continue
+        if not rows:
+            time.sleep(_POLL_SEC)
+            continue
+
+        neu = [e for e in map(_to_experience, rows) if e is not None]
+        wm_ts, wm_id = rows[-1][1], rows[-1][0]
+        if not neu:
+            _save_state(wm_ts, wm_id)
+            continue
+        buffer.extend(neu)
+        # Extern geschriebene Gewichte (pretrain.py) nicht mit dem alten Stand überschreiben
+        if reload_checkpoint_if_changed():
+            logger.info("Checkpoint wurde extern ersetzt – neu geladen.")
+        loss = 0.0
+        for _ in range(_STEPS_PER_ROUND):
+            # Neue Erfahrungen immer im Batch, Rest zufällig aus dem Puffer
+            n_alt = max(0, _BATCH_SIZE - len(neu))
+            alt = buffer.stichprobe(rng, min(n_alt, len(buffer)))
+            loss = _train_step(model, optimizer, (neu + alt)[:max(_BATCH_SIZE, len(neu))])
+
+        save_checkpoint()
+        _save_state(wm_ts, wm_id)
+        version += 1
+        logger.info(
+            "Gewichte v%d veröffentlicht: %d neue Erfahrungen, loss=%.6f",
+            version, len(neu), loss,
+        )
+
+
+if __name__ == "__main__":
+    main()